@@ -1,16 +1,40 @@
+import asyncio
 import jwt
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from passlib.context import CryptContext
+from auth.token_cache import token_cache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Pinning min/max rounds to the configured cost makes passlib
+# flag hashes made with any other cost, so they are upgraded on next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "4"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop while bounding how many hashes run at once
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_CONCURRENCY,
+    thread_name_prefix="password-hash"
+)
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "rich-man-dream-secret-key-2025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+STREAM_TICKET_EXPIRE_SECONDS = int(os.getenv("STREAM_TICKET_EXPIRE_SECONDS", "60"))
+
+# `purpose` claim of stream tickets; tokens with a purpose are not access tokens
+STREAM_TICKET_PURPOSE = "stream"
 
 
 def hash_password(password: str) -> str:
@@ -23,6 +47,24 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the password executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the password executor.
+    
+    Returns (valid, new_hash); new_hash is set when the stored hash was made
+    with a different cost and should be replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -36,22 +78,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.PyJWTError:
+def create_stream_ticket(payload: dict) -> str:
+    """Create a short-lived token that only opens event streams.
+
+    It carries the caller's claims and, as `session_exp`, the expiry of the
+    access token it was issued for, which still ends the stream.
+    """
+    claims = {key: value for key, value in payload.items() if key != "exp"}
+    claims.update({"purpose": STREAM_TICKET_PURPOSE, "session_exp": payload.get("exp")})
+    return create_access_token(claims, timedelta(seconds=STREAM_TICKET_EXPIRE_SECONDS))
+
+
+def verify_token(token: str, purpose: Optional[str] = None) -> Optional[dict]:
+    """Verify and decode a JWT token, reusing cached verifications.
+
+    Only tokens issued for `purpose` are accepted; the default accepts access
+    tokens, which have none.
+    """
+    payload = token_cache.get_payload(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except jwt.PyJWTError:
+            return None
+        token_cache.put_payload(token, payload)
+    
+    if payload.get("purpose") != purpose:
         return None
+    return payload
 
 
 def decode_token(token: str) -> Optional[str]:
     """Decode token and return user email."""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        return email
-    except jwt.PyJWTError:
-        return None
\ No newline at end of file
+    payload = verify_token(token)
+    if payload is None:
+        return None
+    return payload.get("sub")
\ No newline at end of file
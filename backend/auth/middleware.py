@@ -1,7 +1,9 @@
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
-from auth.jwt_handler import decode_token, verify_token
+from typing import NamedTuple, Optional
+from auth.jwt_handler import decode_token, verify_token, STREAM_TICKET_PURPOSE
+from auth.token_cache import token_cache
+from database.connection import users_collection
 
 security = HTTPBearer()
 
@@ -58,6 +60,37 @@ async def get_current_user_data(credentials: HTTPAuthorizationCredentials = Depe
     return payload
 
 
+class AuthenticatedUser(NamedTuple):
+    """Verified token payload together with the user's stored document."""
+    payload: dict
+    user: dict
+
+
+async def get_authenticated_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> AuthenticatedUser:
+    """Get the token payload and user document, both served from cache when fresh."""
+    token = credentials.credentials
+    payload = verify_token(token)
+    
+    if not payload or not payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = token_cache.get_user(token)
+    if user is None:
+        user = await users_collection.find_one({"email": payload["sub"]}, {"password": 0})
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        token_cache.put_user(token, user)
+    
+    return AuthenticatedUser(payload=payload, user=user)
+
+
 # Optional auth for endpoints that can work with or without auth
 async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))) -> Optional[dict]:
     """Get current user data if token is provided, otherwise return None."""
@@ -66,4 +99,31 @@ async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCrede
     
     token = credentials.credentials
     payload = verify_token(token)
+    return payload
+
+
+async def get_stream_user_data(
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /api/events/ticket"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+) -> dict:
+    """Get current user data for streaming endpoints.
+
+    Browsers cannot set headers on an EventSource, so a short-lived stream
+    ticket may be passed as the `ticket` query parameter instead. Access
+    tokens are not accepted in the URL, where access logs would record them.
+    """
+    if credentials:
+        payload = verify_token(credentials.credentials)
+    elif ticket:
+        payload = verify_token(ticket, purpose=STREAM_TICKET_PURPOSE)
+    else:
+        payload = None
+    
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     return payload
\ No newline at end of file
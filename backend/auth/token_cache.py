@@ -0,0 +1,89 @@
+"""In-process cache of verified JWT payloads and the users they belong to.
+
+Entries are keyed by a SHA-256 of the token (the raw token is never kept),
+bounded in size with LRU eviction, and never outlive the token's `exp` claim.
+User documents ride along on the entry with a shorter TTL so profile changes
+still show up promptly.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU of token hash -> payload (and optionally user document)."""
+    
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, user_ttl: float = USER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.user_ttl = user_ttl
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = Lock()
+    
+    def _entry(self, token: str) -> Optional[dict]:
+        key = _token_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+    
+    def get_payload(self, token: str) -> Optional[dict]:
+        """Return a copy of the cached payload, or None if absent or expired."""
+        with self._lock:
+            entry = self._entry(token)
+            return dict(entry["payload"]) if entry else None
+    
+    def put_payload(self, token: str, payload: dict):
+        """Cache a verified payload until its `exp` claim."""
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)) or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[_token_key(token)] = {
+                "payload": dict(payload),
+                "expires_at": expires_at,
+                "user": None,
+                "user_expires_at": 0.0
+            }
+            self._entries.move_to_end(_token_key(token))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def get_user(self, token: str) -> Optional[dict]:
+        """Return the cached user document for a token, if still fresh."""
+        with self._lock:
+            entry = self._entry(token)
+            if not entry or entry["user"] is None or entry["user_expires_at"] <= time.time():
+                return None
+            return dict(entry["user"])
+    
+    def put_user(self, token: str, user: dict):
+        """Attach a user document to an already cached token."""
+        with self._lock:
+            entry = self._entry(token)
+            if entry:
+                entry["user"] = dict(user)
+                entry["user_expires_at"] = time.time() + self.user_ttl
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
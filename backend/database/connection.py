@@ -1,6 +1,7 @@
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
+from database.pool_monitor import PoolStatistics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,7 +10,33 @@ logger = logging.getLogger(__name__)
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 database_name = os.environ.get('DB_NAME', 'richmansdream_db')
 
-client = AsyncIOMotorClient(mongo_url)
+# Connection pool, timeout and wire settings (unset values keep the driver / URL defaults)
+CLIENT_OPTION_ENV = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "timeoutMS": ("MONGO_OPERATION_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),
+    "readPreference": ("MONGO_READ_PREFERENCE", str),
+}
+
+
+def client_options() -> dict:
+    """Motor client options configured through the environment."""
+    options = {}
+    for option, (env_name, cast) in CLIENT_OPTION_ENV.items():
+        value = os.environ.get(env_name)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+pool_statistics = PoolStatistics()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_statistics], **client_options())
 database = client[database_name]
 
 
@@ -32,51 +59,22 @@ viewings_collection = database.viewings
 sales_collection = database.sales
 emails_collection = database.emails
 email_templates_collection = database.email_templates
-
-
-async def create_indexes():
-    """Create database indexes for better performance."""
-    # User indexes
-    await users_collection.create_index("email", unique=True)
-    
-    # Lead indexes
-    await leads_collection.create_index("email")
-    await leads_collection.create_index("status")
-    await leads_collection.create_index("assigned_agent_id")
-    await leads_collection.create_index("created_at")
-    
-    # Call indexes
-    await calls_collection.create_index("lead_id")
-    await calls_collection.create_index("agent_id")
-    await calls_collection.create_index("date")
-    
-    # Viewing indexes
-    await viewings_collection.create_index("lead_id")
-    await viewings_collection.create_index("agent_id")
-    await viewings_collection.create_index("date")
-    await viewings_collection.create_index("status")
-    
-    # Sale indexes
-    await sales_collection.create_index("lead_id")
-    await sales_collection.create_index("agent_id")
-    await sales_collection.create_index("stage")
-    await sales_collection.create_index("expected_close")
-    
-    # Email indexes
-    await emails_collection.create_index("lead_id")
-    await emails_collection.create_index("agent_id")
-    await emails_collection.create_index("status")
-    await emails_collection.create_index("created_at")
-    await emails_collection.create_index("direction")
-    
-    # Email template indexes
-    await email_templates_collection.create_index("template_type")
-    await email_templates_collection.create_index("is_active")
-    
-    logger.info("Database indexes created successfully")
+daily_metrics_collection = database.daily_metrics
+email_outbox_collection = database.email_outbox
+email_campaigns_collection = database.email_campaigns
+sale_events_collection = database.sale_events
+write_generations_collection = database.write_generations
 
 
 async def close_database_connection():
     """Close database connection."""
     client.close()
-    logger.info("Database connection closed")
\ No newline at end of file
+    logger.info("Database connection closed")
+
+
+def get_pool_status() -> dict:
+    """Configured client options and live connection pool counters."""
+    return {
+        "options": client_options(),
+        "servers": pool_statistics.snapshot()
+    }
@@ -0,0 +1,205 @@
+"""Declarative index specification and startup reconciler.
+
+Compound indexes follow the Equality-Sort-Range rule for the query shapes the
+routes actually issue: role scoping (`agent_id` / `assigned_agent_id`) and
+the optional status/stage/direction filter first, then the list sort key with
+`_id` as tie-breaker, so agent-scoped lists are served in index order instead
+of being sorted in memory.
+"""
+import asyncio
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from database.connection import database
+
+logger = logging.getLogger(__name__)
+
+# List sort keys (see utils.pagination and routes.viewings)
+NEWEST_FIRST = [("created_at", DESCENDING), ("_id", DESCENDING)]
+BY_DATE = [("date", ASCENDING), ("_id", ASCENDING)]
+
+# Unique lead email index; bulk import relies on it to reject duplicates
+LEAD_EMAIL_INDEX = "email_unique"
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+INDEX_SPEC = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "leads": [
+        IndexModel([("assigned_agent_id", ASCENDING), ("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("assigned_agent_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel(NEWEST_FIRST),
+        # Unique so bulk imports resolve duplicates on insert; named apart from
+        # the old non-unique email_1 so that one is reported as obsolete
+        IndexModel([("email", ASCENDING)], unique=True, name=LEAD_EMAIL_INDEX),
+        IndexModel([("search_tokens", ASCENDING)]),
+        IndexModel([("budget_cents", ASCENDING)]),
+    ],
+    "calls": [
+        IndexModel([("agent_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("lead_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel(NEWEST_FIRST),
+    ],
+    "viewings": [
+        IndexModel([("agent_id", ASCENDING), ("status", ASCENDING)] + BY_DATE),
+        IndexModel([("agent_id", ASCENDING)] + BY_DATE),
+        IndexModel([("status", ASCENDING)] + BY_DATE),
+        IndexModel(BY_DATE),
+        IndexModel([("lead_id", ASCENDING)] + NEWEST_FIRST),
+    ],
+    "sales": [
+        IndexModel([("agent_id", ASCENDING), ("stage", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("agent_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("stage", ASCENDING)] + NEWEST_FIRST),
+        IndexModel(NEWEST_FIRST),
+        IndexModel([("lead_id", ASCENDING)] + NEWEST_FIRST),
+    ],
+    "sale_events": [
+        IndexModel([("lead_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("sale_id", ASCENDING)]),
+    ],
+    "emails": [
+        IndexModel([("agent_id", ASCENDING), ("direction", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("agent_id", ASCENDING), ("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("agent_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("lead_id", ASCENDING)] + NEWEST_FIRST),
+        # One email per lead and campaign, so a resumed campaign batch is not sent twice
+        IndexModel(
+            [("campaign_id", ASCENDING), ("lead_id", ASCENDING)],
+            unique=True, partialFilterExpression={"campaign_id": {"$exists": True}}
+        ),
+        IndexModel([("direction", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel(NEWEST_FIRST),
+    ],
+    "email_templates": [
+        IndexModel([("template_type", ASCENDING), ("is_active", ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("email_id", ASCENDING)], unique=True),
+        # Finished jobs are kept for a week, then expire
+        IndexModel([("completed_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "email_campaigns": [
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)]),
+    ],
+    "daily_metrics": [
+        IndexModel([("agent_id", ASCENDING), ("day", ASCENDING)], unique=True),
+        IndexModel([("day", ASCENDING)]),
+    ],
+}
+
+
+# Index options compared with the spec besides the key
+COMPARED_OPTIONS = ("partialFilterExpression", "expireAfterSeconds")
+COMPARED_FLAGS = ("unique", "sparse")
+
+
+def _same_definition(model: IndexModel, existing: dict) -> bool:
+    """Whether an existing index (from index_information) matches the spec."""
+    document = model.document
+    return (
+        list(document["key"].items()) == [tuple(key) for key in existing["key"]]
+        and all(bool(document.get(flag)) == bool(existing.get(flag)) for flag in COMPARED_FLAGS)
+        and all(document.get(option) == existing.get(option) for option in COMPARED_OPTIONS)
+    )
+
+
+async def _duplicate_keys(collection, model: IndexModel, limit: int = 10) -> list:
+    """Sample of key values that occur more than once, which block a unique index."""
+    fields = list(model.document["key"])
+    pipeline = [
+        {"$group": {"_id": {field.replace(".", "_"): f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit}
+    ]
+    return [group["_id"] async for group in collection.aggregate(pipeline)]
+
+
+async def _reconcile_collection(collection_name: str, models: list, drop_obsolete: bool) -> dict:
+    """Reconcile the indexes of one collection.
+
+    Missing non-unique indexes are built in a single createIndexes command.
+    Unique ones are built separately: existing duplicates make their build
+    fail, which must not hold back the others.
+    """
+    collection = database[collection_name]
+    existing = await collection.index_information()
+    wanted = {model.document["name"]: model for model in models}
+    
+    missing = [model for name, model in wanted.items() if name not in existing]
+    conflicting = [
+        name for name, model in wanted.items()
+        if name in existing and not _same_definition(model, existing[name])
+    ]
+    obsolete = [name for name in existing if name != "_id_" and name not in wanted]
+    
+    created, failed = [], []
+    batch = [model for model in missing if not model.document.get("unique")]
+    if batch:
+        await collection.create_indexes(batch)
+        created += [model.document["name"] for model in batch]
+    
+    for model in missing:
+        if not model.document.get("unique"):
+            continue
+        try:
+            await collection.create_indexes([model])
+            created.append(model.document["name"])
+        except OperationFailure as exc:
+            if exc.code != DUPLICATE_KEY_ERROR:
+                raise
+            failed.append(model.document["name"])
+            logger.error(
+                f"Cannot build unique index {model.document['name']} on {collection_name}: "
+                f"duplicate values exist, e.g. {await _duplicate_keys(collection, model)}. "
+                f"Resolve them and reconcile again"
+            )
+    
+    if created:
+        logger.info(f"Created indexes on {collection_name}: {created}")
+    
+    if conflicting:
+        logger.warning(f"Indexes on {collection_name} differ from the spec: {conflicting}")
+    
+    if obsolete:
+        if drop_obsolete:
+            for name in obsolete:
+                await collection.drop_index(name)
+            logger.info(f"Dropped obsolete indexes on {collection_name}: {obsolete}")
+        else:
+            logger.warning(f"Obsolete indexes on {collection_name} (not dropped): {obsolete}")
+    
+    return {
+        "created": created,
+        "failed": failed,
+        "obsolete": obsolete,
+        "conflicting": conflicting
+    }
+
+
+async def reconcile_indexes(drop_obsolete: bool = False) -> dict:
+    """Bring every collection's indexes in line with INDEX_SPEC, all collections concurrently.
+
+    Missing indexes are created. Indexes not in the spec are reported, and
+    dropped only when drop_obsolete is set. Indexes whose name matches but
+    whose definition differs are reported and left untouched.
+    Unique indexes that cannot be built because of duplicate values are
+    reported as failed. Returns a per-collection summary of created, failed,
+    obsolete and conflicting names.
+    """
+    names = list(INDEX_SPEC)
+    results = await asyncio.gather(*(
+        _reconcile_collection(name, INDEX_SPEC[name], drop_obsolete) for name in names
+    ))
+    
+    logger.info("Database indexes reconciled")
+    return dict(zip(names, results))
@@ -0,0 +1,68 @@
+"""Connection pool statistics collected from PyMongo's CMAP monitoring events."""
+from collections import defaultdict
+import threading
+
+from pymongo import monitoring
+
+
+class PoolStatistics(monitoring.ConnectionPoolListener):
+    """Counts pool events per server so pool sizing can be checked at runtime."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: {
+            "open": 0,
+            "in_use": 0,
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkout_timeouts": 0,
+            "cleared": 0
+        })
+
+    def _update(self, address, **changes):
+        key = "%s:%s" % address
+        with self._lock:
+            stats = self._servers[key]
+            for name, amount in changes.items():
+                stats[name] += amount
+
+    def snapshot(self) -> dict:
+        """Current counters per server address."""
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._servers.items()}
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        timeouts = 1 if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT else 0
+        self._update(event.address, checkout_failures=1, checkout_timeouts=timeouts)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
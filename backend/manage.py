@@ -0,0 +1,115 @@
+"""Maintenance commands for the Rich Man Dream CRM backend.
+
+Usage:
+    python manage.py seed
+    python manage.py rebuild-metrics
+    python manage.py migrate-numeric
+    python manage.py index-search
+    python manage.py reconcile-indexes [--drop-obsolete]
+    python manage.py email-worker [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+sys.path.append(str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+async def seed(args):
+    """Seed an empty database with demo users and CRM data."""
+    from database.indexes import reconcile_indexes as reconcile
+    from utils.conditional import bump_generations
+    from utils.seed_data import seed_database
+    
+    await reconcile()
+    await seed_database()
+    await bump_generations("leads", "calls", "viewings", "sales", "emails", "email_templates")
+
+
+async def rebuild_metrics(args):
+    """Recompute the daily_metrics rollup from the raw collections."""
+    from utils.daily_metrics import rebuild_daily_metrics
+    
+    rows = await rebuild_daily_metrics()
+    print(f"Daily metrics rebuilt: {rows} rows")
+
+
+async def migrate_numeric(args):
+    """Backfill value_cents / price_cents / budget_cents on existing documents."""
+    from utils.conditional import bump_generations
+    from utils.migrations import migrate_numeric_amounts
+    
+    migrated = await migrate_numeric_amounts()
+    await bump_generations(*migrated)
+    for collection_name, count in migrated.items():
+        print(f"{collection_name}: {count} documents migrated")
+
+
+async def index_search(args):
+    """Rebuild the lead search tokens for every lead."""
+    from utils.migrations import backfill_lead_search_tokens
+    
+    updated = await backfill_lead_search_tokens(rebuild=True)
+    print(f"Search tokens rebuilt for {updated} leads")
+
+
+async def reconcile_indexes(args):
+    """Create missing indexes and report (or drop) obsolete ones."""
+    from database.indexes import reconcile_indexes as reconcile
+    
+    summary = await reconcile(drop_obsolete=args.drop_obsolete)
+    for collection_name, changes in summary.items():
+        print(f"{collection_name}: {changes}")
+
+
+async def email_worker(args):
+    """Send queued emails and run email campaigns until interrupted."""
+    from utils.email_queue import EmailWorkerPool, EMAIL_WORKER_CONCURRENCY
+    
+    await EmailWorkerPool(concurrency=args.concurrency or EMAIL_WORKER_CONCURRENCY).run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rich Man Dream CRM maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    commands.add_parser("seed", help=seed.__doc__).set_defaults(handler=seed)
+    commands.add_parser("rebuild-metrics", help=rebuild_metrics.__doc__).set_defaults(handler=rebuild_metrics)
+    commands.add_parser("migrate-numeric", help=migrate_numeric.__doc__).set_defaults(handler=migrate_numeric)
+    commands.add_parser("index-search", help=index_search.__doc__).set_defaults(handler=index_search)
+    
+    reconcile_parser = commands.add_parser("reconcile-indexes", help=reconcile_indexes.__doc__)
+    reconcile_parser.add_argument("--drop-obsolete", action="store_true", help="Drop indexes not in the spec")
+    reconcile_parser.set_defaults(handler=reconcile_indexes)
+    
+    worker_parser = commands.add_parser("email-worker", help=email_worker.__doc__)
+    worker_parser.add_argument("--concurrency", type=int, help="Number of concurrent senders")
+    worker_parser.set_defaults(handler=email_worker)
+    
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+async def run(args):
+    """Run a command and close the database connection afterwards."""
+    from database.connection import close_database_connection
+    
+    try:
+        await args.handler(args)
+    finally:
+        await close_database_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -80,4 +80,14 @@ class EmailTemplate(EmailTemplateBase):
     model_config = {
         "populate_by_name": True,
         "arbitrary_types_allowed": True
-    }
\ No newline at end of file
+    }
+
+
+# Email Campaign Models
+class EmailCampaignCreate(BaseModel):
+    template_id: str = Field(alias="templateId")
+    # Lead filter, as on GET /api/leads
+    status: Optional[Literal["hot", "warm", "cold"]] = None
+    search: Optional[str] = None
+    min_budget: Optional[float] = Field(alias="minBudget", default=None, ge=0, allow_inf_nan=False)
+    max_budget: Optional[float] = Field(alias="maxBudget", default=None, ge=0, allow_inf_nan=False)
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, model_validator, EmailStr
 from typing import Optional, Literal
 from datetime import datetime
+from pydantic.json_schema import SkipJsonSchema
+from models.money import amount_to_cents, without_fields
 
 
 class LeadBase(BaseModel):
@@ -10,11 +12,25 @@ class LeadBase(BaseModel):
     status: Literal["hot", "warm", "cold"] = "cold"
     source: str
     budget: str
+    budget_cents: SkipJsonSchema[Optional[int]] = None  # budget in cents, derived from `budget`
     property_type: str = Field(alias="propertyType")
     assigned_agent: str = Field(alias="assignedAgent")
     assigned_agent_id: Optional[str] = Field(alias="assignedAgentId", default=None)
     notes: Optional[str] = ""
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_budget_cents(cls, data):
+        """`budget_cents` is never accepted from clients."""
+        return without_fields(data, "budget_cents")
+
+    @model_validator(mode="after")
+    def _set_budget_cents(self):
+        """Keep `budget_cents` in sync with the `budget` display string."""
+        if self.budget is not None:
+            self.budget_cents = amount_to_cents(self.budget)
+        return self
+
 
 class LeadCreate(LeadBase):
     pass
@@ -27,12 +43,26 @@ class LeadUpdate(BaseModel):
     status: Optional[Literal["hot", "warm", "cold"]] = None
     source: Optional[str] = None
     budget: Optional[str] = None
+    budget_cents: SkipJsonSchema[Optional[int]] = None  # budget in cents, derived from `budget`
     property_type: Optional[str] = Field(alias="propertyType", default=None)
     assigned_agent: Optional[str] = Field(alias="assignedAgent", default=None)
     assigned_agent_id: Optional[str] = Field(alias="assignedAgentId", default=None)
     notes: Optional[str] = None
     last_contact: Optional[datetime] = Field(alias="lastContact", default=None)
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_budget_cents(cls, data):
+        """`budget_cents` is never accepted from clients."""
+        return without_fields(data, "budget_cents")
+
+    @model_validator(mode="after")
+    def _set_budget_cents(self):
+        """Keep `budget_cents` in sync with the `budget` display string."""
+        if self.budget is not None:
+            self.budget_cents = amount_to_cents(self.budget)
+        return self
+
 
 class Lead(LeadBase):
     id: str = Field(alias="_id")
@@ -0,0 +1,37 @@
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+import re
+
+# Multipliers for shorthand amounts such as "$850K" or "1.2M"
+_SUFFIXES = {"": 1, "k": 1_000, "m": 1_000_000, "b": 1_000_000_000}
+_AMOUNT_RE = re.compile(r"^\$?\s*([0-9]*\.?[0-9]+)\s*([kmb]?)$", re.IGNORECASE)
+
+
+def amount_to_cents(value) -> Optional[int]:
+    """Parse a display amount such as "$850,000" or "$1.2M" into integer cents.
+
+    Returns None when the value is empty, not a single amount (e.g. a range),
+    a bool or not finite.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        amount = Decimal(str(value))
+        return int(amount * 100) if amount.is_finite() else None
+    
+    match = _AMOUNT_RE.match(str(value).replace(",", "").strip())
+    if not match:
+        return None
+    
+    try:
+        amount = Decimal(match.group(1)) * _SUFFIXES[match.group(2).lower()]
+    except InvalidOperation:
+        return None
+    return int(amount * 100)
+
+
+def without_fields(data, *fields):
+    """Drop derived fields from raw model input so clients cannot set them."""
+    if isinstance(data, dict):
+        return {key: value for key, value in data.items() if key not in fields}
+    return data
\ No newline at end of file
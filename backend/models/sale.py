@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Literal
 from datetime import datetime
+from pydantic.json_schema import SkipJsonSchema
+from models.money import amount_to_cents, without_fields
 
 
 class SaleBase(BaseModel):
@@ -11,9 +13,23 @@ class SaleBase(BaseModel):
     agent_id: Optional[str] = Field(alias="agentId", default=None)
     stage: Literal["contacted", "viewed", "negotiation", "closed"] = "contacted"
     value: str
+    value_cents: SkipJsonSchema[Optional[int]] = None  # value in cents, derived from `value`
     probability: int = Field(ge=0, le=100)
     expected_close: str = Field(alias="expectedClose")
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_value_cents(cls, data):
+        """`value_cents` is never accepted from clients."""
+        return without_fields(data, "value_cents")
+
+    @model_validator(mode="after")
+    def _set_value_cents(self):
+        """Keep `value_cents` in sync with the `value` display string."""
+        if self.value is not None:
+            self.value_cents = amount_to_cents(self.value)
+        return self
+
 
 class SaleCreate(SaleBase):
     pass
@@ -27,10 +43,24 @@ class SaleUpdate(BaseModel):
     agent_id: Optional[str] = Field(alias="agentId", default=None)
     stage: Optional[Literal["contacted", "viewed", "negotiation", "closed"]] = None
     value: Optional[str] = None
+    value_cents: SkipJsonSchema[Optional[int]] = None  # value in cents, derived from `value`
     probability: Optional[int] = Field(ge=0, le=100, default=None)
     expected_close: Optional[str] = Field(alias="expectedClose", default=None)
     last_activity: Optional[datetime] = Field(alias="lastActivity", default=None)
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_value_cents(cls, data):
+        """`value_cents` is never accepted from clients."""
+        return without_fields(data, "value_cents")
+
+    @model_validator(mode="after")
+    def _set_value_cents(self):
+        """Keep `value_cents` in sync with the `value` display string."""
+        if self.value is not None:
+            self.value_cents = amount_to_cents(self.value)
+        return self
+
 
 class Sale(SaleBase):
     id: str = Field(alias="_id")
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Literal
 from datetime import datetime
+from pydantic.json_schema import SkipJsonSchema
+from models.money import amount_to_cents, without_fields
 
 
 class ViewingBase(BaseModel):
@@ -14,8 +16,22 @@ class ViewingBase(BaseModel):
     agent_id: Optional[str] = Field(alias="agentId", default=None)
     status: Literal["scheduled", "completed", "cancelled"] = "scheduled"
     price: str
+    price_cents: SkipJsonSchema[Optional[int]] = None  # price in cents, derived from `price`
     type: str
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_price_cents(cls, data):
+        """`price_cents` is never accepted from clients."""
+        return without_fields(data, "price_cents")
+
+    @model_validator(mode="after")
+    def _set_price_cents(self):
+        """Keep `price_cents` in sync with the `price` display string."""
+        if self.price is not None:
+            self.price_cents = amount_to_cents(self.price)
+        return self
+
 
 class ViewingCreate(ViewingBase):
     pass
@@ -32,8 +48,22 @@ class ViewingUpdate(BaseModel):
     agent_id: Optional[str] = Field(alias="agentId", default=None)
     status: Optional[Literal["scheduled", "completed", "cancelled"]] = None
     price: Optional[str] = None
+    price_cents: SkipJsonSchema[Optional[int]] = None  # price in cents, derived from `price`
     type: Optional[str] = None
 
+    @model_validator(mode="before")
+    @classmethod
+    def _ignore_price_cents(cls, data):
+        """`price_cents` is never accepted from clients."""
+        return without_fields(data, "price_cents")
+
+    @model_validator(mode="after")
+    def _set_price_cents(self):
+        """Keep `price_cents` in sync with the `price` display string."""
+        if self.price is not None:
+            self.price_cents = amount_to_cents(self.price)
+        return self
+
 
 class Viewing(ViewingBase):
     id: str = Field(alias="_id")
@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel, EmailStr
 from database.connection import users_collection
-from auth.jwt_handler import verify_password, create_access_token
-from auth.middleware import get_current_user_email, get_current_user_data
+from auth.jwt_handler import verify_password_async, create_access_token
+from auth.middleware import get_authenticated_user, AuthenticatedUser
 from models.user import UserResponse
 from bson import ObjectId
 
@@ -41,12 +41,17 @@ async def login(login_data: LoginRequest):
         )
     
     # Verify password
-    if not verify_password(login_data.password, user_doc["password"]):
+    valid, new_hash = await verify_password_async(login_data.password, user_doc["password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
+    # Upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        await users_collection.update_one({"_id": user_doc["_id"]}, {"$set": {"password": new_hash}})
+    
     # Create access token
     token_data = {
         "sub": user_doc["email"],
@@ -80,15 +85,10 @@ async def logout():
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(user_email: str = Depends(get_current_user_email)):
+async def get_current_user(current: AuthenticatedUser = Depends(get_authenticated_user)):
     """Get current user information."""
     
-    user_doc = await users_collection.find_one({"email": user_email})
-    if not user_doc:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    user_doc = current.user
     
     return UserResponse(
         id=str(user_doc["_id"]),
@@ -3,22 +3,31 @@ from typing import List, Optional
 from database.connection import calls_collection, leads_collection
 from auth.middleware import get_current_user_data
 from models.call import CallCreate, CallUpdate
+from utils.pagination import paginate, TotalMode, NEWEST_FIRST
+from utils.writes import update_scoped
+from utils.conditional import bump_generations, conditional_get
+from utils.dashboard_cache import invalidate_dashboards
+from utils.projections import list_projection, ViewMode
+from utils.exports import export_response, export_columns, ExportFormat
+from utils.serializers import CRMJSONResponse, serialize_document, serialize_documents
 from bson import ObjectId
 from datetime import datetime
-import math
+import asyncio
 
 router = APIRouter(prefix="/calls", tags=["Calls"])
 
+# Fields returned by view=summary: the list columns; omits notes
+CALL_SUMMARY_FIELDS = (
+    "lead_id", "lead_name", "leadName", "agent", "agent_id", "type",
+    "duration", "date", "time", "status", "created_at"
+)
 
-@router.get("/")
-async def get_calls(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
-    lead_id: Optional[str] = Query(None),
-    agent: Optional[str] = Query(None),
-    user_data: dict = Depends(get_current_user_data)
-):
-    """Get paginated calls with optional filters."""
+# Columns of a full CSV export
+CALL_EXPORT_FIELDS = CALL_SUMMARY_FIELDS + ("notes",)
+
+
+def _calls_query(lead_id: Optional[str], agent: Optional[str], user_data: dict) -> dict:
+    """Filters and role scoping shared by the list and export routes."""
     
     # Build query
     query = {}
@@ -37,34 +46,60 @@ async def get_calls(
     if user_data.get("role") == "agent":
         query["agent_id"] = ObjectId(user_data.get("user_id"))
     
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
+    return query
+
+
+@router.get("/", dependencies=[Depends(conditional_get("calls"))])
+async def get_calls(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[TotalMode] = Query(None),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    lead_id: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get paginated calls with optional filters."""
     
-    # Get total count
-    total = await calls_collection.count_documents(query)
+    query = _calls_query(lead_id, agent, user_data)
     
-    # Get calls
-    cursor = calls_collection.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    calls = await cursor.to_list(length=limit)
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, CALL_SUMMARY_FIELDS, NEWEST_FIRST)
     
-    # Convert ObjectIds to strings
-    for call in calls:
-        call["id"] = str(call["_id"])
-        del call["_id"]
-        call["lead_id"] = str(call["lead_id"])
-        if "agent_id" in call and call["agent_id"]:
-            call["agent_id"] = str(call["agent_id"])
+    # Get calls and the requested total concurrently
+    calls, pagination = await paginate(
+        calls_collection, query, NEWEST_FIRST, page, limit,
+        cursor=cursor, include_total=include_total, projection=projection
+    )
     
-    return {
-        "calls": calls,
-        "total": total,
-        "page": page,
-        "pages": math.ceil(total / limit),
-        "limit": limit
-    }
+    return CRMJSONResponse({"calls": serialize_documents(calls), **pagination})
 
 
-@router.get("/{call_id}")
+@router.get("/export")
+async def export_calls(
+    format: ExportFormat = Query("csv"),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    lead_id: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Stream every matching call as a CSV or NDJSON download."""
+    
+    query = _calls_query(lead_id, agent, user_data)
+    
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, CALL_SUMMARY_FIELDS, NEWEST_FIRST)
+    
+    return export_response(
+        calls_collection, query, NEWEST_FIRST, format, "calls",
+        projection=projection, columns=export_columns(projection, CALL_EXPORT_FIELDS)
+    )
+
+
+@router.get("/{call_id}", dependencies=[Depends(conditional_get("calls"))])
 async def get_call(
     call_id: str,
     user_data: dict = Depends(get_current_user_data)
@@ -83,14 +118,7 @@ async def get_call(
         if str(call.get("agent_id")) != user_data.get("user_id"):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Convert ObjectIds to strings
-    call["id"] = str(call["_id"])
-    del call["_id"]
-    call["lead_id"] = str(call["lead_id"])
-    if "agent_id" in call and call["agent_id"]:
-        call["agent_id"] = str(call["agent_id"])
-    
-    return {"call": call}
+    return CRMJSONResponse({"call": serialize_document(call)})
 
 
 @router.post("/")
@@ -129,26 +157,22 @@ async def create_call(
     if isinstance(call_dict.get("agent_id"), str):
         call_dict["agent_id"] = ObjectId(call_dict["agent_id"])
     
-    # Insert call
-    result = await calls_collection.insert_one(call_dict)
-    
-    # Update lead's last_contact
-    await leads_collection.update_one(
-        {"_id": call_dict["lead_id"]},
-        {"$set": {"last_contact": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+    # Insert call and update lead's last_contact concurrently;
+    # the in-memory document is what was stored
+    await asyncio.gather(
+        calls_collection.insert_one(call_dict),
+        leads_collection.update_one(
+            {"_id": call_dict["lead_id"]},
+            {"$set": {"last_contact": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+        )
     )
+    created_call = call_dict
     
-    # Get the created call
-    created_call = await calls_collection.find_one({"_id": result.inserted_id})
-    
-    # Convert ObjectIds to strings
-    created_call["id"] = str(created_call["_id"])
-    del created_call["_id"]
-    created_call["lead_id"] = str(created_call["lead_id"])
-    if "agent_id" in created_call and created_call["agent_id"]:
-        created_call["agent_id"] = str(created_call["agent_id"])
+    # Drop cached dashboards and client copies
+    await invalidate_dashboards(created_call)
+    await bump_generations("calls", "leads")
     
-    return {"call": created_call}
+    return CRMJSONResponse({"call": serialize_document(created_call)})
 
 
 @router.put("/{call_id}")
@@ -162,15 +186,10 @@ async def update_call(
     if not ObjectId.is_valid(call_id):
         raise HTTPException(status_code=400, detail="Invalid call ID")
     
-    # Check if call exists
-    existing_call = await calls_collection.find_one({"_id": ObjectId(call_id)})
-    if not existing_call:
-        raise HTTPException(status_code=404, detail="Call not found")
-    
     # Role-based access: agents can only update their own calls
+    scope = {}
     if user_data.get("role") == "agent":
-        if str(existing_call.get("agent_id")) != user_data.get("user_id"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        scope["agent_id"] = ObjectId(user_data.get("user_id"))
     
     # Prepare update data
     update_dict = call_data.dict(by_alias=True, exclude_unset=True)
@@ -180,24 +199,18 @@ async def update_call(
             update_dict["lead_id"] = ObjectId(update_dict["lead_id"])
         if "agent_id" in update_dict and isinstance(update_dict["agent_id"], str):
             update_dict["agent_id"] = ObjectId(update_dict["agent_id"])
-        
-        # Update call
-        await calls_collection.update_one(
-            {"_id": ObjectId(call_id)},
-            {"$set": update_dict}
-        )
     
-    # Get updated call
-    updated_call = await calls_collection.find_one({"_id": ObjectId(call_id)})
+    # Update call with the access check in the filter
+    existing_call, updated_call = await update_scoped(
+        calls_collection, ObjectId(call_id), scope, update_dict,
+        not_found_detail="Call not found"
+    )
     
-    # Convert ObjectIds to strings
-    updated_call["id"] = str(updated_call["_id"])
-    del updated_call["_id"]
-    updated_call["lead_id"] = str(updated_call["lead_id"])
-    if "agent_id" in updated_call and updated_call["agent_id"]:
-        updated_call["agent_id"] = str(updated_call["agent_id"])
+    # Drop cached dashboards and client copies
+    await invalidate_dashboards(existing_call, updated_call)
+    await bump_generations("calls")
     
-    return {"call": updated_call}
+    return CRMJSONResponse({"call": serialize_document(updated_call)})
 
 
 @router.delete("/{call_id}")
@@ -214,12 +227,13 @@ async def delete_call(
     if not ObjectId.is_valid(call_id):
         raise HTTPException(status_code=400, detail="Invalid call ID")
     
-    # Check if call exists
-    call = await calls_collection.find_one({"_id": ObjectId(call_id)})
+    # Delete call
+    call = await calls_collection.find_one_and_delete({"_id": ObjectId(call_id)})
     if not call:
         raise HTTPException(status_code=404, detail="Call not found")
     
-    # Delete call
-    await calls_collection.delete_one({"_id": ObjectId(call_id)})
+    # Drop cached dashboards and client copies
+    await invalidate_dashboards(call)
+    await bump_generations("calls")
     
     return {"success": True, "message": "Call deleted successfully"}
\ No newline at end of file
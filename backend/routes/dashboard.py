@@ -1,219 +1,183 @@
-from fastapi import APIRouter, Depends
-from database.connection import leads_collection, calls_collection, viewings_collection, sales_collection
+from fastapi import APIRouter, Depends, Request
+from database.connection import daily_metrics_collection
 from auth.middleware import get_current_user_data
+from utils.conditional import conditional_get
+from utils.dashboard_cache import cached_dashboard
 from datetime import datetime, timedelta
 from bson import ObjectId
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
+# Collections whose writes feed the daily metrics rollup
+DASHBOARD_SOURCES = ("leads", "calls", "viewings", "sales")
 
-@router.get("/stats")
-async def get_dashboard_stats(user_data: dict = Depends(get_current_user_data)):
-    """Get dashboard statistics."""
-    
-    # Role-based filtering
-    base_filter = {}
+
+def _metrics_filter(user_data: dict) -> dict:
+    """Role-based filter on the daily metrics rollup: agents only see their own rows."""
     if user_data.get("role") == "agent":
-        agent_id = ObjectId(user_data.get("user_id"))
-        base_filter = {"agent_id": agent_id}
+        return {"agent_id": ObjectId(user_data.get("user_id"))}
+    return {}
+
+
+def _month_start(year: int, month: int) -> datetime:
+    """Return the first day of a month, normalising month overflow/underflow."""
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return datetime(year, month, 1)
+
+
+@router.get("/stats", dependencies=[Depends(conditional_get(*DASHBOARD_SOURCES))])
+async def get_dashboard_stats(request: Request, user_data: dict = Depends(get_current_user_data)):
+    """Get dashboard statistics."""
+    return await cached_dashboard("stats", request, user_data, lambda: _dashboard_stats(user_data))
+
+
+@router.get("/charts", dependencies=[Depends(conditional_get(*DASHBOARD_SOURCES))])
+async def get_dashboard_charts(request: Request, user_data: dict = Depends(get_current_user_data)):
+    """Get chart data for dashboard."""
+    return await cached_dashboard("charts", request, user_data, lambda: _dashboard_charts(user_data))
+
+
+async def _dashboard_stats(user_data: dict) -> dict:
+    """Compute the dashboard statistics from the daily rollup."""
     
     # Get current month start
     now = datetime.utcnow()
     month_start = datetime(now.year, now.month, 1)
     
-    # Count total leads
-    leads_filter = {}
-    if user_data.get("role") == "agent":
-        leads_filter["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
+    def this_month(field: str) -> dict:
+        return {"$sum": {"$cond": [{"$gte": ["$day", month_start]}, f"${field}", 0]}}
     
-    total_leads = await leads_collection.count_documents(leads_filter)
-    
-    # Count hot leads
-    hot_leads_filter = {**leads_filter, "status": "hot"}
-    hot_leads = await leads_collection.count_documents(hot_leads_filter)
-    
-    # Count scheduled viewings
-    viewings_filter = {**base_filter, "status": "scheduled"}
-    scheduled_viewings = await viewings_collection.count_documents(viewings_filter)
-    
-    # Count active sales (not closed)
-    sales_filter = {**base_filter, "stage": {"$ne": "closed"}}
-    active_sales = await sales_collection.count_documents(sales_filter)
-    
-    # Count closed deals this month
-    closed_deals_filter = {
-        **base_filter,
-        "stage": "closed",
-        "last_activity": {"$gte": month_start}
-    }
-    closed_deals_this_month = await sales_collection.count_documents(closed_deals_filter)
-    
-    # Calculate total revenue from closed deals this month
+    # Sum the precomputed daily rows in a single aggregation
     pipeline = [
-        {"$match": closed_deals_filter},
-        {
-            "$addFields": {
-                "value_numeric": {
-                    "$toDouble": {
-                        "$replaceAll": {
-                            "input": {"$replaceAll": {"input": "$value", "find": "$", "replacement": ""}},
-                            "find": ",",
-                            "replacement": ""
-                        }
-                    }
-                }
-            }
-        },
+        {"$match": _metrics_filter(user_data)},
         {
             "$group": {
                 "_id": None,
-                "total_revenue": {"$sum": "$value_numeric"}
+                "total_leads": {"$sum": "$leads_created"},
+                "hot_leads": {"$sum": "$leads_hot"},
+                "scheduled_viewings": {"$sum": "$viewings_scheduled"},
+                "active_sales": {"$sum": "$sales_active"},
+                "closed_deals_this_month": this_month("sales_closed"),
+                "total_revenue": this_month("revenue_closed")
             }
         }
     ]
-    
-    revenue_result = await sales_collection.aggregate(pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total_revenue"] if revenue_result else 0
+    result = await daily_metrics_collection.aggregate(pipeline).to_list(1)
+    totals = result[0] if result else {}
     
     # Calculate monthly growth (mock for now)
     monthly_growth = 12.5  # This would require historical data comparison
     
     return {
-        "totalLeads": total_leads,
-        "hotLeads": hot_leads,
-        "scheduledViewings": scheduled_viewings,
-        "activeSales": active_sales,
-        "closedDealsThisMonth": closed_deals_this_month,
-        "totalRevenue": f"${total_revenue:,.0f}",
+        "totalLeads": totals.get("total_leads", 0),
+        "hotLeads": totals.get("hot_leads", 0),
+        "scheduledViewings": totals.get("scheduled_viewings", 0),
+        "activeSales": totals.get("active_sales", 0),
+        "closedDealsThisMonth": totals.get("closed_deals_this_month", 0),
+        "totalRevenue": f"${totals.get('total_revenue', 0):,.0f}",
         "monthlyGrowth": monthly_growth
     }
 
 
-@router.get("/charts")
-async def get_dashboard_charts(user_data: dict = Depends(get_current_user_data)):
-    """Get chart data for dashboard."""
+async def _dashboard_charts(user_data: dict) -> dict:
+    """Compute the dashboard chart series from the daily rollup."""
     
-    # Role-based filtering
-    base_filter = {}
-    if user_data.get("role") == "agent":
-        agent_id = ObjectId(user_data.get("user_id"))
-        base_filter = {"agent_id": agent_id}
+    now = datetime.utcnow()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Sales chart data (last 6 months)
-    sales_chart = []
-    for i in range(6):
-        month_start = datetime(datetime.utcnow().year, datetime.utcnow().month - i, 1)
-        if month_start.month <= 0:
-            month_start = datetime(month_start.year - 1, month_start.month + 12, 1)
-        
-        next_month = month_start.replace(month=month_start.month + 1) if month_start.month < 12 else month_start.replace(year=month_start.year + 1, month=1)
-        
-        # Get closed deals for the month
-        sales_filter = {
-            **base_filter,
-            "stage": "closed",
-            "last_activity": {"$gte": month_start, "$lt": next_month}
-        }
-        
-        # Calculate revenue for the month
-        pipeline = [
-            {"$match": sales_filter},
-            {
-                "$addFields": {
-                    "value_numeric": {
-                        "$toDouble": {
-                            "$replaceAll": {
-                                "input": {"$replaceAll": {"input": "$value", "find": "$", "replacement": ""}},
-                                "find": ",",
-                                "replacement": ""
-                            }
+    # Last 6 months, last 4 weeks (starting Monday) and last 7 days, oldest first
+    months = [_month_start(now.year, now.month - i) for i in range(5, -1, -1)]
+    this_week = today - timedelta(days=today.weekday())
+    weeks = [this_week - timedelta(weeks=i) for i in range(3, -1, -1)]
+    days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    
+    # Every chart is a facet over the same precomputed daily rows
+    pipeline = [
+        {"$match": _metrics_filter(user_data)},
+        {
+            "$facet": {
+                "sales": [
+                    {"$match": {"day": {"$gte": months[0]}}},
+                    {
+                        "$group": {
+                            "_id": {"year": {"$year": "$day"}, "month": {"$month": "$day"}},
+                            "total": {"$sum": "$revenue_closed"}
                         }
                     }
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": "$value_numeric"}
-                }
+                ],
+                "leads": [
+                    {"$match": {"day": {"$gte": weeks[0], "$lt": weeks[-1] + timedelta(days=7)}}},
+                    {
+                        "$bucket": {
+                            "groupBy": "$day",
+                            "boundaries": weeks + [weeks[-1] + timedelta(days=7)],
+                            "output": {"count": {"$sum": "$leads_created"}}
+                        }
+                    }
+                ],
+                "status": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "hot": {"$sum": "$leads_hot"},
+                            "warm": {"$sum": "$leads_warm"},
+                            "cold": {"$sum": "$leads_cold"}
+                        }
+                    }
+                ],
+                "viewings": [
+                    {"$match": {"day": {"$gte": days[0]}}},
+                    {
+                        "$group": {
+                            "_id": "$day",
+                            "completed": {"$sum": "$viewings_completed"},
+                            "scheduled": {"$sum": "$viewings_scheduled"}
+                        }
+                    }
+                ]
             }
-        ]
-        
-        result = await sales_collection.aggregate(pipeline).to_list(1)
-        monthly_revenue = result[0]["total"] if result else 0
-        
-        sales_chart.insert(0, {
-            "month": month_start.strftime("%b"),
-            "sales": int(monthly_revenue)
-        })
+        }
+    ]
+    result = await daily_metrics_collection.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {}
+    
+    # Sales chart data (last 6 months)
+    revenue = {(row["_id"]["year"], row["_id"]["month"]): row["total"] for row in facets.get("sales", [])}
+    sales_chart = [
+        {"month": month.strftime("%b"), "sales": int(revenue.get((month.year, month.month), 0))}
+        for month in months
+    ]
     
     # Leads chart data (last 4 weeks)
-    leads_chart = []
-    for i in range(4):
-        week_start = datetime.utcnow() - timedelta(weeks=i, days=datetime.utcnow().weekday())
-        week_end = week_start + timedelta(days=7)
-        
-        leads_filter = {}
-        if user_data.get("role") == "agent":
-            leads_filter["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
-        
-        leads_filter["created_at"] = {"$gte": week_start, "$lt": week_end}
-        
-        week_leads = await leads_collection.count_documents(leads_filter)
-        
-        leads_chart.insert(0, {
-            "week": f"W{4-i}",
-            "leads": week_leads
-        })
+    weekly_leads = {row["_id"]: row["count"] for row in facets.get("leads", [])}
+    leads_chart = [
+        {"week": f"W{i + 1}", "leads": weekly_leads.get(week_start, 0)}
+        for i, week_start in enumerate(weeks)
+    ]
     
     # Status distribution
-    leads_filter = {}
-    if user_data.get("role") == "agent":
-        leads_filter["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
-    
-    hot_count = await leads_collection.count_documents({**leads_filter, "status": "hot"})
-    warm_count = await leads_collection.count_documents({**leads_filter, "status": "warm"})
-    cold_count = await leads_collection.count_documents({**leads_filter, "status": "cold"})
-    
+    status_counts = (facets.get("status") or [{}])[0]
     status_distribution = [
-        {"name": "Hot", "value": hot_count, "color": "#FFD700"},
-        {"name": "Warm", "value": warm_count, "color": "#FFA500"},
-        {"name": "Cold", "value": cold_count, "color": "#CD853F"}
+        {"name": "Hot", "value": status_counts.get("hot", 0), "color": "#FFD700"},
+        {"name": "Warm", "value": status_counts.get("warm", 0), "color": "#FFA500"},
+        {"name": "Cold", "value": status_counts.get("cold", 0), "color": "#CD853F"}
     ]
     
     # Viewings chart data (last 7 days)
-    viewings_chart = []
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    
-    for i, day in enumerate(days):
-        day_start = datetime.utcnow() - timedelta(days=6-i)
-        day_start = day_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        completed_filter = {
-            **base_filter,
-            "status": "completed",
-            "created_at": {"$gte": day_start, "$lt": day_end}
-        }
-        
-        scheduled_filter = {
-            **base_filter,
-            "status": "scheduled",
-            "created_at": {"$gte": day_start, "$lt": day_end}
+    daily_viewings = {row["_id"]: row for row in facets.get("viewings", [])}
+    viewings_chart = [
+        {
+            "day": day.strftime("%a"),
+            "completed": daily_viewings.get(day, {}).get("completed", 0),
+            "scheduled": daily_viewings.get(day, {}).get("scheduled", 0)
         }
-        
-        completed = await viewings_collection.count_documents(completed_filter)
-        scheduled = await viewings_collection.count_documents(scheduled_filter)
-        
-        viewings_chart.append({
-            "day": day,
-            "completed": completed,
-            "scheduled": scheduled
-        })
+        for day in days
+    ]
     
     return {
         "salesChart": sales_chart,
         "leadsChart": leads_chart,
         "statusDistribution": status_distribution,
         "viewingsChart": viewings_chart
-    }
\ No newline at end of file
+    }
@@ -1,26 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
-from database.connection import emails_collection, email_templates_collection, leads_collection
+from database.connection import (
+    emails_collection, email_templates_collection, email_campaigns_collection, leads_collection
+)
 from auth.middleware import get_current_user_data
-from models.email import EmailCreate, EmailUpdate, EmailTemplateCreate, EmailTemplateUpdate
+from models.email import (
+    EmailCreate, EmailUpdate, EmailTemplateCreate, EmailTemplateUpdate, EmailCampaignCreate
+)
+from utils.query import leads_query
+from utils.pagination import paginate, TotalMode, NEWEST_FIRST
+from utils.writes import update_scoped
+from utils.conditional import bump_generations, conditional_get
+from utils.email_queue import enqueue_email
+from utils.email_campaigns import campaign_sender, campaigns_available
+from utils.projections import list_projection, ViewMode
+from utils.templates import compiled_template, template_values, unknown_placeholders
+from utils.exports import export_response, export_columns, ExportFormat
+from utils.serializers import CRMJSONResponse, serialize_document, serialize_documents
 from bson import ObjectId
 from datetime import datetime
-import math
 import re
 
 router = APIRouter(prefix="/emails", tags=["Emails"])
 
+# Fields returned by view=summary: the list columns; omits the email body
+EMAIL_SUMMARY_FIELDS = (
+    "lead_id", "lead_name", "leadName", "to_email", "toEmail", "from_email", "fromEmail",
+    "subject", "email_type", "emailType", "status", "direction",
+    "agent_id", "agent_name", "agentName", "created_at", "sent_at"
+)
 
-@router.get("/")
-async def get_emails(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
-    lead_id: Optional[str] = Query(None),
-    status: Optional[str] = Query(None),
-    direction: Optional[str] = Query(None),
-    user_data: dict = Depends(get_current_user_data)
-):
-    """Get paginated emails with optional filters."""
+# Columns of a full CSV export
+EMAIL_EXPORT_FIELDS = EMAIL_SUMMARY_FIELDS + ("content", "updated_at")
+
+
+def _emails_query(lead_id: Optional[str], status: Optional[str], direction: Optional[str], user_data: dict) -> dict:
+    """Filters and role scoping shared by the list and export routes."""
     
     # Build query
     query = {}
@@ -43,35 +58,62 @@ async def get_emails(
     if user_data.get("role") == "agent":
         query["agent_id"] = ObjectId(user_data.get("user_id"))
     
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
-    
-    # Get total count
-    total = await emails_collection.count_documents(query)
-    
-    # Get emails
-    cursor = emails_collection.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    emails = await cursor.to_list(length=limit)
-    
-    # Convert ObjectIds to strings
-    for email in emails:
-        email["id"] = str(email["_id"])
-        del email["_id"]
-        if "lead_id" in email and email["lead_id"]:
-            email["lead_id"] = str(email["lead_id"])
-        if "agent_id" in email and email["agent_id"]:
-            email["agent_id"] = str(email["agent_id"])
-    
-    return {
-        "emails": emails,
-        "total": total,
-        "page": page,
-        "pages": math.ceil(total / limit),
-        "limit": limit
-    }
+    return query
 
 
-@router.get("/{email_id}")
+@router.get("/", dependencies=[Depends(conditional_get("emails"))])
+async def get_emails(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[TotalMode] = Query(None),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    lead_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    direction: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get paginated emails with optional filters."""
+    
+    query = _emails_query(lead_id, status, direction, user_data)
+    
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, EMAIL_SUMMARY_FIELDS, NEWEST_FIRST)
+    
+    # Get emails and the requested total concurrently
+    emails, pagination = await paginate(
+        emails_collection, query, NEWEST_FIRST, page, limit,
+        cursor=cursor, include_total=include_total, projection=projection
+    )
+    
+    return CRMJSONResponse({"emails": serialize_documents(emails), **pagination})
+
+
+@router.get("/export")
+async def export_emails(
+    format: ExportFormat = Query("csv"),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    lead_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    direction: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Stream every matching email as a CSV or NDJSON download."""
+    
+    query = _emails_query(lead_id, status, direction, user_data)
+    
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, EMAIL_SUMMARY_FIELDS, NEWEST_FIRST)
+    
+    return export_response(
+        emails_collection, query, NEWEST_FIRST, format, "emails",
+        projection=projection, columns=export_columns(projection, EMAIL_EXPORT_FIELDS)
+    )
+
+
+@router.get("/{email_id}", dependencies=[Depends(conditional_get("emails"))])
 async def get_email(
     email_id: str,
     user_data: dict = Depends(get_current_user_data)
@@ -90,21 +132,12 @@ async def get_email(
         if str(email.get("agent_id")) != user_data.get("user_id"):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Convert ObjectIds to strings
-    email["id"] = str(email["_id"])
-    del email["_id"]
-    if "lead_id" in email and email["lead_id"]:
-        email["lead_id"] = str(email["lead_id"])
-    if "agent_id" in email and email["agent_id"]:
-        email["agent_id"] = str(email["agent_id"])
-    
-    return {"email": email}
+    return CRMJSONResponse({"email": serialize_document(email)})
 
 
 @router.post("/")
 async def create_email(
     email_data: EmailCreate,
-    background_tasks: BackgroundTasks,
     user_data: dict = Depends(get_current_user_data)
 ):
     """Create a new email."""
@@ -135,25 +168,17 @@ async def create_email(
     if isinstance(email_dict.get("agent_id"), str):
         email_dict["agent_id"] = ObjectId(email_dict["agent_id"])
     
-    # Insert email
-    result = await emails_collection.insert_one(email_dict)
+    # Insert email; the in-memory document is what was stored
+    await emails_collection.insert_one(email_dict)
+    created_email = email_dict
     
-    # If email is marked to be sent, add to background task
+    # If email is marked to be sent, queue it for delivery
     if email_dict.get("status") == "sent":
-        background_tasks.add_task(send_email_task, str(result.inserted_id))
-    
-    # Get the created email
-    created_email = await emails_collection.find_one({"_id": result.inserted_id})
+        await enqueue_email(email_dict)
     
-    # Convert ObjectIds to strings
-    created_email["id"] = str(created_email["_id"])
-    del created_email["_id"]
-    if "lead_id" in created_email and created_email["lead_id"]:
-        created_email["lead_id"] = str(created_email["lead_id"])
-    if "agent_id" in created_email and created_email["agent_id"]:
-        created_email["agent_id"] = str(created_email["agent_id"])
+    await bump_generations("emails")
     
-    return {"email": created_email}
+    return CRMJSONResponse({"email": serialize_document(created_email)})
 
 
 @router.put("/{email_id}")
@@ -167,15 +192,10 @@ async def update_email(
     if not ObjectId.is_valid(email_id):
         raise HTTPException(status_code=400, detail="Invalid email ID")
     
-    # Check if email exists
-    existing_email = await emails_collection.find_one({"_id": ObjectId(email_id)})
-    if not existing_email:
-        raise HTTPException(status_code=404, detail="Email not found")
-    
     # Role-based access: agents can only update their own emails
+    scope = {}
     if user_data.get("role") == "agent":
-        if str(existing_email.get("agent_id")) != user_data.get("user_id"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        scope["agent_id"] = ObjectId(user_data.get("user_id"))
     
     # Prepare update data
     update_dict = email_data.dict(by_alias=True, exclude_unset=True)
@@ -187,25 +207,15 @@ async def update_email(
             update_dict["lead_id"] = ObjectId(update_dict["lead_id"])
         if "agent_id" in update_dict and update_dict["agent_id"] and isinstance(update_dict["agent_id"], str):
             update_dict["agent_id"] = ObjectId(update_dict["agent_id"])
-        
-        # Update email
-        await emails_collection.update_one(
-            {"_id": ObjectId(email_id)},
-            {"$set": update_dict}
-        )
     
-    # Get updated email
-    updated_email = await emails_collection.find_one({"_id": ObjectId(email_id)})
+    # Update email with the access check in the filter
+    _, updated_email = await update_scoped(
+        emails_collection, ObjectId(email_id), scope, update_dict,
+        not_found_detail="Email not found"
+    )
+    await bump_generations("emails")
     
-    # Convert ObjectIds to strings
-    updated_email["id"] = str(updated_email["_id"])
-    del updated_email["_id"]
-    if "lead_id" in updated_email and updated_email["lead_id"]:
-        updated_email["lead_id"] = str(updated_email["lead_id"])
-    if "agent_id" in updated_email and updated_email["agent_id"]:
-        updated_email["agent_id"] = str(updated_email["agent_id"])
-    
-    return {"email": updated_email}
+    return CRMJSONResponse({"email": serialize_document(updated_email)})
 
 
 @router.delete("/{email_id}")
@@ -222,19 +232,17 @@ async def delete_email(
     if not ObjectId.is_valid(email_id):
         raise HTTPException(status_code=400, detail="Invalid email ID")
     
-    # Check if email exists
-    email = await emails_collection.find_one({"_id": ObjectId(email_id)})
+    # Delete email
+    email = await emails_collection.find_one_and_delete({"_id": ObjectId(email_id)})
     if not email:
         raise HTTPException(status_code=404, detail="Email not found")
-    
-    # Delete email
-    await emails_collection.delete_one({"_id": ObjectId(email_id)})
+    await bump_generations("emails")
     
     return {"success": True, "message": "Email deleted successfully"}
 
 
 # Email Templates Endpoints
-@router.get("/templates/")
+@router.get("/templates/", dependencies=[Depends(conditional_get("email_templates"))])
 async def get_email_templates(
     user_data: dict = Depends(get_current_user_data)
 ):
@@ -244,12 +252,7 @@ async def get_email_templates(
     cursor = email_templates_collection.find({"isActive": True}).sort("created_at", -1)
     templates = await cursor.to_list(length=100)
     
-    # Convert ObjectIds to strings
-    for template in templates:
-        template["id"] = str(template["_id"])
-        del template["_id"]
-    
-    return {"templates": templates}
+    return CRMJSONResponse({"templates": serialize_documents(templates)})
 
 
 @router.post("/templates/")
@@ -263,29 +266,31 @@ async def create_email_template(
     if user_data.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
+    # Placeholders the renderer cannot fill would be sent as written
+    unknown = unknown_placeholders(template_data.subject, template_data.content)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown template variables: {', '.join('{' + name + '}' for name in unknown)}"
+        )
+    
     # Prepare template document
     template_dict = template_data.dict(by_alias=True)
     template_dict["created_at"] = datetime.utcnow()
     template_dict["updated_at"] = datetime.utcnow()
     
-    # Insert template
-    result = await email_templates_collection.insert_one(template_dict)
-    
-    # Get the created template
-    created_template = await email_templates_collection.find_one({"_id": result.inserted_id})
-    
-    # Convert ObjectIds to strings
-    created_template["id"] = str(created_template["_id"])
-    del created_template["_id"]
+    # Insert template; the in-memory document is what was stored
+    await email_templates_collection.insert_one(template_dict)
+    created_template = template_dict
+    await bump_generations("email_templates")
     
-    return {"template": created_template}
+    return CRMJSONResponse({"template": serialize_document(created_template)})
 
 
 @router.post("/send-template/")
 async def send_template_email(
     template_id: str,
     lead_id: str,
-    background_tasks: BackgroundTasks,
     user_data: dict = Depends(get_current_user_data)
 ):
     """Send an email using a template."""
@@ -306,9 +311,8 @@ async def send_template_email(
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    # Replace template variables
-    subject = replace_template_variables(template["subject"], lead, user_data)
-    content = replace_template_variables(template["content"], lead, user_data)
+    # Render the compiled template
+    subject, content = compiled_template(template).render(template_values(lead, user_data))
     
     # Create email from template
     email_dict = {
@@ -329,73 +333,86 @@ async def send_template_email(
         "sent_at": datetime.utcnow()
     }
     
-    # Insert email
-    result = await emails_collection.insert_one(email_dict)
+    # Insert email and queue it for delivery
+    await emails_collection.insert_one(email_dict)
+    await enqueue_email(email_dict)
+    await bump_generations("emails")
     
-    # Add to background task for actual sending
-    background_tasks.add_task(send_email_task, str(result.inserted_id))
-    
-    return {"success": True, "message": "Template email queued for sending", "email_id": str(result.inserted_id)}
+    return {"success": True, "message": "Template email queued for sending", "email_id": str(email_dict["_id"])}
 
 
-def replace_template_variables(content: str, lead: dict, user_data: dict) -> str:
-    """Replace template variables with actual values."""
-    
-    variables = {
-        "{lead_name}": lead.get("name", ""),
-        "{lead_email}": lead.get("email", ""),
-        "{lead_phone}": lead.get("phone", ""),
-        "{lead_budget}": lead.get("budget", ""),
-        "{property_type}": lead.get("property_type", ""),
-        "{agent_name}": user_data.get("name", ""),
-        "{agent_email}": user_data.get("email", ""),
-        "{company_name}": "Rich Man Dream",
-        "{date}": datetime.now().strftime("%B %d, %Y"),
-        "{time}": datetime.now().strftime("%I:%M %p")
+@router.post("/campaigns/", status_code=202)
+async def create_email_campaign(
+    campaign_data: EmailCampaignCreate,
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Send a template to every lead matching a filter; progress is polled by campaign id."""
+    
+    # Verify template exists
+    if not ObjectId.is_valid(campaign_data.template_id):
+        raise HTTPException(status_code=400, detail="Invalid template ID")
+    
+    template = await email_templates_collection.find_one({"_id": ObjectId(campaign_data.template_id)})
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    # Same filters and role scoping as the leads list
+    query = leads_query(
+        campaign_data.search, campaign_data.status,
+        campaign_data.min_budget, campaign_data.max_budget, user_data
+    )
+    
+    campaign = {
+        "template_id": template["_id"],
+        "template_name": template.get("name"),
+        "filter": campaign_data.dict(exclude={"template_id"}, exclude_none=True),
+        "sender": campaign_sender(user_data),
+        "status": "queued",
+        "lease_until": datetime.utcnow(),
+        "last_lead_id": None,
+        "total": await leads_collection.count_documents(query),
+        "processed": 0,
+        "queued": 0,
+        "skipped": 0,
+        "agent_id": ObjectId(user_data.get("user_id")),
+        "agent_name": user_data.get("name"),
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
     }
+    await email_campaigns_collection.insert_one(campaign)
     
-    for variable, value in variables.items():
-        content = content.replace(variable, str(value))
+    # The email workers render and queue it; the client polls the campaign
+    campaigns_available.set()
     
-    return content
+    return CRMJSONResponse({"campaign": serialize_document(campaign)}, status_code=202)
 
 
-async def send_email_task(email_id: str):
-    """Background task to simulate email sending."""
-    
-    # In a real implementation, this would integrate with an email service like SendGrid
-    # For now, we'll just update the email status to "delivered"
-    
-    try:
-        await emails_collection.update_one(
-            {"_id": ObjectId(email_id)},
-            {
-                "$set": {
-                    "status": "delivered",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        print(f"Email {email_id} marked as delivered")
-    except Exception as e:
-        # Mark as failed if there's an error
-        await emails_collection.update_one(
-            {"_id": ObjectId(email_id)},
-            {
-                "$set": {
-                    "status": "failed",
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        print(f"Email {email_id} marked as failed: {str(e)}")
+@router.get("/campaigns/{campaign_id}")
+async def get_email_campaign(
+    campaign_id: str,
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get the progress of an email campaign."""
+    
+    if not ObjectId.is_valid(campaign_id):
+        raise HTTPException(status_code=400, detail="Invalid campaign ID")
+    
+    campaign = await email_campaigns_collection.find_one({"_id": ObjectId(campaign_id)})
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    # Role-based access: agents can only see their own campaigns
+    if user_data.get("role") == "agent":
+        if str(campaign.get("agent_id")) != user_data.get("user_id"):
+            raise HTTPException(status_code=403, detail="Access denied")
+    
+    return CRMJSONResponse({"campaign": serialize_document(campaign)})
 
 
 # Notification Triggers
 @router.post("/triggers/new-lead/")
 async def trigger_new_lead_email(
     lead_id: str,
-    background_tasks: BackgroundTasks,
     user_data: dict = Depends(get_current_user_data)
 ):
     """Trigger welcome email for new lead."""
@@ -403,7 +420,7 @@ async def trigger_new_lead_email(
     # Find welcome email template
     template = await email_templates_collection.find_one({"template_type": "welcome", "is_active": True})
     if template:
-        await send_template_email(str(template["_id"]), lead_id, background_tasks, user_data)
+        await send_template_email(str(template["_id"]), lead_id, user_data)
         return {"success": True, "message": "Welcome email triggered"}
     
     return {"success": False, "message": "No welcome template found"}
@@ -412,7 +429,6 @@ async def trigger_new_lead_email(
 @router.post("/triggers/viewing-reminder/")
 async def trigger_viewing_reminder_email(
     viewing_id: str,
-    background_tasks: BackgroundTasks,
     user_data: dict = Depends(get_current_user_data)
 ):
     """Trigger viewing reminder email."""
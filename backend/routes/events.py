@@ -0,0 +1,80 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from auth.jwt_handler import create_stream_ticket, STREAM_TICKET_EXPIRE_SECONDS
+from auth.middleware import get_current_user_data, get_stream_user_data
+from utils.change_feed import change_feed, sse_message, LIVE_COLLECTIONS, CHANGE_FEED_HEARTBEAT_SECONDS
+import asyncio
+import time
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+async def _event_stream(user_data: dict, collections: frozenset, last_event_id: Optional[str]):
+    """Yield the missed events, then live events and heartbeats until the token expires."""
+    # Subscribed once the response starts: a client gone before then leaves no subscriber behind
+    subscriber, missed = change_feed.subscribe(user_data, collections, last_event_id)
+    # A stream opened with a ticket lasts as long as the access token behind it
+    expires_at = user_data.get("session_exp", user_data.get("exp"))
+    try:
+        if missed is None:
+            yield sse_message("resync", {"reason": "history"})
+        else:
+            for event in missed:
+                yield sse_message("change", event.payload(subscriber.user_data), event.token)
+        
+        while expires_at is None or time.time() < expires_at:
+            # A client that fell behind gets what was queued, then a resync
+            if subscriber.overflowed and subscriber.queue.empty():
+                subscriber.overflowed = False
+                yield sse_message("resync", {"reason": "overflow"})
+            
+            timeout = CHANGE_FEED_HEARTBEAT_SECONDS
+            if expires_at is not None:
+                timeout = min(timeout, max(expires_at - time.time(), 0))
+            
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield b": heartbeat\n\n"
+                continue
+            
+            if event is None:
+                yield sse_message("resync", {"reason": "history"})
+            else:
+                yield sse_message("change", event.payload(subscriber.user_data), event.token)
+        
+        # Token expired: the client reconnects with a fresh one and its last event id
+        yield sse_message("expired", {})
+    finally:
+        change_feed.unsubscribe(subscriber)
+
+
+@router.post("/ticket")
+async def create_ticket(user_data: dict = Depends(get_current_user_data)):
+    """Issue a short-lived ticket for opening an event stream from a browser EventSource.
+
+    Pass it as `?ticket=`; request a new one for every (re)connection.
+    """
+    return {"ticket": create_stream_ticket(user_data), "expiresIn": STREAM_TICKET_EXPIRE_SECONDS}
+
+
+@router.get("/stream")
+async def stream_events(
+    collections: Optional[str] = Query(None, description="Comma-separated collections, default all"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    resume_after: Optional[str] = Query(None, alias="lastEventId"),
+    user_data: dict = Depends(get_stream_user_data)
+):
+    """Stream role-scoped changes to leads, calls, viewings, sales and emails (Server-Sent Events)."""
+    
+    requested = frozenset(collections.split(",")) if collections else frozenset(LIVE_COLLECTIONS)
+    unknown = requested - set(LIVE_COLLECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(sorted(unknown))}")
+    
+    return StreamingResponse(
+        _event_stream(user_data, requested, last_event_id or resume_after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,81 +1,223 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
 from typing import List, Optional
-from database.connection import leads_collection, users_collection
+from pydantic import FiniteFloat
+from database.connection import leads_collection
 from auth.middleware import get_current_user_data
 from models.lead import LeadCreate, LeadUpdate
+from utils.conditional import bump_generations, conditional_get
+from utils.dashboard_cache import invalidate_dashboards
+from utils.daily_metrics import track_lead_change
+from utils.search import lead_search_tokens, SEARCH_FIELDS
+from utils.query import leads_query
+from utils.pagination import paginate, TotalMode, NEWEST_FIRST
+from utils.writes import update_scoped
+from utils.timeline import lead_timeline
+from utils.lead_import import (
+    build_lead_document, find_default_agent, import_leads, ImportFormat,
+    IMPORT_BATCH_SIZE, IMPORT_CONTENT_TYPES
+)
+from utils.projections import list_projection, ViewMode
+from utils.exports import export_response, export_columns, ExportFormat
+from utils.serializers import CRMJSONResponse, serialize_document, serialize_documents
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
-import math
 
 router = APIRouter(prefix="/leads", tags=["Leads"])
 
+# Fields returned by view=summary: the list columns; omits notes
+LEAD_SUMMARY_FIELDS = (
+    "name", "email", "phone", "status", "source", "budget", "budget_cents",
+    "property_type", "propertyType", "assigned_agent", "assignedAgent", "assigned_agent_id",
+    "created_at", "updated_at", "last_contact", "lastContact"
+)
 
-@router.get("/")
+# Columns of a full CSV export
+LEAD_EXPORT_FIELDS = LEAD_SUMMARY_FIELDS + ("notes",)
+
+# The search index is internal and never returned to clients
+LEAD_INTERNAL_FIELDS = ("search_tokens",)
+LEAD_PROJECTION = {field: 0 for field in LEAD_INTERNAL_FIELDS}
+
+# Related documents included in the lead overview, trimmed to what the detail page shows
+OVERVIEW_SALE_FIELDS = {
+    "property": 1, "stage": 1, "value": 1, "value_cents": 1, "probability": 1,
+    "expected_close": 1, "agent": 1, "last_activity": 1, "created_at": 1
+}
+OVERVIEW_VIEWING_FIELDS = {"property": 1, "address": 1, "date": 1, "time": 1, "status": 1, "agent": 1}
+OVERVIEW_CALL_FIELDS = {"type": 1, "duration": 1, "status": 1, "notes": 1, "agent": 1, "created_at": 1}
+OVERVIEW_EMAIL_FIELDS = {"subject": 1, "status": 1, "direction": 1, "agent_name": 1, "created_at": 1}
+
+
+@router.get("/", dependencies=[Depends(conditional_get("leads"))])
 async def get_leads(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[TotalMode] = Query(None),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
+    min_budget: Optional[FiniteFloat] = Query(None, ge=0, allow_inf_nan=False),
+    max_budget: Optional[FiniteFloat] = Query(None, ge=0, allow_inf_nan=False),
     user_data: dict = Depends(get_current_user_data)
 ):
     """Get paginated leads with optional search and filter."""
     
-    # Build query
-    query = {}
+    query = leads_query(search, status, min_budget, max_budget, user_data)
     
-    # Add search filter
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-            {"phone": {"$regex": search, "$options": "i"}}
-        ]
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, LEAD_SUMMARY_FIELDS, NEWEST_FIRST, internal_fields=LEAD_INTERNAL_FIELDS)
     
-    # Add status filter
-    if status:
-        query["status"] = status
+    # Get leads and the requested total concurrently
+    leads, pagination = await paginate(
+        leads_collection, query, NEWEST_FIRST, page, limit,
+        cursor=cursor, include_total=include_total, projection=projection
+    )
     
-    # Role-based access: agents can only see their own leads
-    if user_data.get("role") == "agent":
-        query["assigned_agent_id"] = user_data.get("user_id")
+    return CRMJSONResponse({"leads": serialize_documents(leads), **pagination})
+
+
+@router.get("/export")
+async def export_leads(
+    format: ExportFormat = Query("csv"),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    search: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    min_budget: Optional[FiniteFloat] = Query(None, ge=0, allow_inf_nan=False),
+    max_budget: Optional[FiniteFloat] = Query(None, ge=0, allow_inf_nan=False),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Stream every matching lead as a CSV or NDJSON download."""
     
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
+    query = leads_query(search, status, min_budget, max_budget, user_data)
     
-    # Get total count
-    total = await leads_collection.count_documents(query)
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, LEAD_SUMMARY_FIELDS, NEWEST_FIRST, internal_fields=LEAD_INTERNAL_FIELDS)
     
-    # Get leads
-    cursor = leads_collection.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    leads = await cursor.to_list(length=limit)
+    return export_response(
+        leads_collection, query, NEWEST_FIRST, format, "leads",
+        projection=projection, columns=export_columns(projection, LEAD_EXPORT_FIELDS)
+    )
+
+
+@router.get("/{lead_id}", dependencies=[Depends(conditional_get("leads"))])
+async def get_lead(
+    lead_id: str,
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get a specific lead by ID."""
     
-    # Convert ObjectId to string
-    for lead in leads:
-        lead["id"] = str(lead["_id"])
-        del lead["_id"]
-        if "assigned_agent_id" in lead and lead["assigned_agent_id"]:
-            lead["assigned_agent_id"] = str(lead["assigned_agent_id"])
+    if not ObjectId.is_valid(lead_id):
+        raise HTTPException(status_code=400, detail="Invalid lead ID")
     
+    lead = await leads_collection.find_one({"_id": ObjectId(lead_id)}, LEAD_PROJECTION)
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    # Role-based access: agents can only see their own leads
+    if user_data.get("role") == "agent":
+        if str(lead.get("assigned_agent_id")) != user_data.get("user_id"):
+            raise HTTPException(status_code=403, detail="Access denied")
+    
+    return CRMJSONResponse({"lead": serialize_document(lead)})
+
+
+def _activity_lookup(collection_name: str, latest: list, as_field: str) -> dict:
+    """$lookup of a lead's documents in one collection: their count plus the `latest` sub-pipeline."""
     return {
-        "leads": leads,
-        "total": total,
-        "page": page,
-        "pages": math.ceil(total / limit),
-        "limit": limit
+        "$lookup": {
+            "from": collection_name,
+            "localField": "_id",
+            "foreignField": "lead_id",
+            "pipeline": [{"$facet": {"total": [{"$count": "total"}], "latest": latest}}],
+            "as": as_field
+        }
     }
 
 
-@router.get("/{lead_id}")
-async def get_lead(
+def _lead_overview_pipeline(lead_id: ObjectId, today: str) -> list:
+    """Lead plus its sale, next viewing, activity counts and latest touches, in one aggregation."""
+    newest_first = {"$sort": {"created_at": -1, "_id": -1}}
+    return [
+        {"$match": {"_id": lead_id}},
+        {"$project": LEAD_PROJECTION},
+        _activity_lookup("sales", [newest_first, {"$limit": 1}, {"$project": OVERVIEW_SALE_FIELDS}], "sales"),
+        _activity_lookup("viewings", [
+            {"$match": {"status": "scheduled", "date": {"$gte": today}}},
+            {"$sort": {"date": 1, "_id": 1}},
+            {"$limit": 1},
+            {"$project": OVERVIEW_VIEWING_FIELDS}
+        ], "viewings"),
+        _activity_lookup("calls", [newest_first, {"$limit": 1}, {"$project": OVERVIEW_CALL_FIELDS}], "calls"),
+        _activity_lookup("emails", [newest_first, {"$limit": 1}, {"$project": OVERVIEW_EMAIL_FIELDS}], "emails")
+    ]
+
+
+def _activity_summary(lead: dict, field: str) -> tuple:
+    """Pop a lookup result off the lead and return (count, latest document or None)."""
+    facets = lead.pop(field, None) or [{}]
+    total = facets[0].get("total") or [{}]
+    latest = facets[0].get("latest")
+    return total[0].get("total", 0), serialize_document(latest[0]) if latest else None
+
+
+@router.get("/{lead_id}/overview", dependencies=[Depends(conditional_get("leads", "calls", "emails", "viewings", "sales"))])
+async def get_lead_overview(
     lead_id: str,
     user_data: dict = Depends(get_current_user_data)
 ):
-    """Get a specific lead by ID."""
+    """Get a lead with its sale, next viewing, activity counts and latest call and email."""
+    
+    if not ObjectId.is_valid(lead_id):
+        raise HTTPException(status_code=400, detail="Invalid lead ID")
+    
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    results = await leads_collection.aggregate(_lead_overview_pipeline(ObjectId(lead_id), today)).to_list(length=1)
+    if not results:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    lead = results[0]
+    
+    # Role-based access: agents can only see their own leads
+    if user_data.get("role") == "agent":
+        if str(lead.get("assigned_agent_id")) != user_data.get("user_id"):
+            raise HTTPException(status_code=403, detail="Access denied")
+    
+    sales_count, sale = _activity_summary(lead, "sales")
+    viewings_count, next_viewing = _activity_summary(lead, "viewings")
+    calls_count, latest_call = _activity_summary(lead, "calls")
+    emails_count, latest_email = _activity_summary(lead, "emails")
+    
+    return CRMJSONResponse({
+        "lead": serialize_document(lead),
+        "sale": sale,
+        "nextViewing": next_viewing,
+        "activity": {
+            "calls": calls_count,
+            "emails": emails_count,
+            "viewings": viewings_count,
+            "sales": sales_count
+        },
+        "latestCall": latest_call,
+        "latestEmail": latest_email
+    })
+
+
+@router.get("/{lead_id}/timeline", dependencies=[Depends(conditional_get("leads", "calls", "emails", "viewings", "sales"))])
+async def get_lead_timeline(
+    lead_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get a lead's calls, emails, viewings and sales as one newest-first stream."""
     
     if not ObjectId.is_valid(lead_id):
         raise HTTPException(status_code=400, detail="Invalid lead ID")
     
-    lead = await leads_collection.find_one({"_id": ObjectId(lead_id)})
+    lead = await leads_collection.find_one({"_id": ObjectId(lead_id)}, {"assigned_agent_id": 1})
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
@@ -84,13 +226,9 @@ async def get_lead(
         if str(lead.get("assigned_agent_id")) != user_data.get("user_id"):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Convert ObjectId to string
-    lead["id"] = str(lead["_id"])
-    del lead["_id"]
-    if "assigned_agent_id" in lead and lead["assigned_agent_id"]:
-        lead["assigned_agent_id"] = str(lead["assigned_agent_id"])
+    items, next_cursor = await lead_timeline(lead["_id"], limit, cursor)
     
-    return {"lead": lead}
+    return CRMJSONResponse({"timeline": items, "limit": limit, "nextCursor": next_cursor})
 
 
 @router.post("/")
@@ -100,45 +238,46 @@ async def create_lead(
 ):
     """Create a new lead."""
     
-    # Check if email already exists
-    existing_lead = await leads_collection.find_one({"email": lead_data.email})
-    if existing_lead:
-        raise HTTPException(status_code=400, detail="Lead with this email already exists")
-    
     # Prepare lead document
-    lead_dict = lead_data.dict(by_alias=True)
-    lead_dict["created_at"] = datetime.utcnow()
-    lead_dict["updated_at"] = datetime.utcnow()
-    
-    # If no assigned agent specified, assign to current user if they're an agent
-    if not lead_dict.get("assigned_agent_id"):
-        if user_data.get("role") == "agent":
-            lead_dict["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
-            lead_dict["assigned_agent"] = user_data.get("name")
-        else:
-            # For admin, find the first available agent
-            agent = await users_collection.find_one({"role": "agent"})
-            if agent:
-                lead_dict["assigned_agent_id"] = agent["_id"]
-                lead_dict["assigned_agent"] = agent["name"]
-    
-    # Convert assigned_agent_id to ObjectId if it's a string
-    if lead_dict.get("assigned_agent_id") and isinstance(lead_dict["assigned_agent_id"], str):
-        lead_dict["assigned_agent_id"] = ObjectId(lead_dict["assigned_agent_id"])
-    
-    # Insert lead
-    result = await leads_collection.insert_one(lead_dict)
+    lead_dict = build_lead_document(lead_data, user_data, await find_default_agent(user_data))
     
-    # Get the created lead
-    created_lead = await leads_collection.find_one({"_id": result.inserted_id})
+    # Insert lead; the in-memory document is what was stored.
+    # The unique email index rejects an email another lead already has
+    try:
+        await leads_collection.insert_one(lead_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Lead with this email already exists")
+    created_lead = lead_dict
     
-    # Convert ObjectId to string
-    created_lead["id"] = str(created_lead["_id"])
-    del created_lead["_id"]
-    if "assigned_agent_id" in created_lead and created_lead["assigned_agent_id"]:
-        created_lead["assigned_agent_id"] = str(created_lead["assigned_agent_id"])
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_lead_change(None, created_lead)
+    await invalidate_dashboards(created_lead)
+    await bump_generations("leads")
     
-    return {"lead": created_lead}
+    return CRMJSONResponse({"lead": serialize_document(created_lead, exclude=LEAD_INTERNAL_FIELDS)})
+
+
+@router.post("/import")
+async def import_leads_upload(
+    request: Request,
+    format: Optional[ImportFormat] = Query(None),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Bulk import leads from a streamed CSV (with header) or NDJSON request body."""
+    
+    # The format comes from the query string or the Content-Type header
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        format = IMPORT_CONTENT_TYPES.get(content_type)
+        if format is None:
+            raise HTTPException(
+                status_code=415,
+                detail="Upload text/csv or application/x-ndjson, or pass format=csv|ndjson"
+            )
+    
+    report = await import_leads(request.stream(), format, user_data, batch_size=batch_size)
+    return CRMJSONResponse(report)
 
 
 @router.put("/{lead_id}")
@@ -152,15 +291,10 @@ async def update_lead(
     if not ObjectId.is_valid(lead_id):
         raise HTTPException(status_code=400, detail="Invalid lead ID")
     
-    # Check if lead exists
-    existing_lead = await leads_collection.find_one({"_id": ObjectId(lead_id)})
-    if not existing_lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
-    
     # Role-based access: agents can only update their own leads
+    scope = {}
     if user_data.get("role") == "agent":
-        if str(existing_lead.get("assigned_agent_id")) != user_data.get("user_id"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        scope["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
     
     # Prepare update data
     update_dict = lead_data.dict(by_alias=True, exclude_unset=True)
@@ -172,22 +306,34 @@ async def update_lead(
             if isinstance(update_dict["assigned_agent_id"], str):
                 update_dict["assigned_agent_id"] = ObjectId(update_dict["assigned_agent_id"])
         
-        # Update lead
-        await leads_collection.update_one(
-            {"_id": ObjectId(lead_id)},
-            {"$set": update_dict}
+        # Rebuild search index tokens when a searchable field changes,
+        # reading only the searchable fields the update does not provide
+        if any(field in update_dict for field in SEARCH_FIELDS):
+            stored_fields = {}
+            missing_fields = [field for field in SEARCH_FIELDS if field not in update_dict]
+            if missing_fields:
+                stored_fields = await leads_collection.find_one(
+                    {"_id": ObjectId(lead_id), **scope},
+                    {field: 1 for field in missing_fields}
+                ) or {}
+            update_dict["search_tokens"] = lead_search_tokens({**stored_fields, **update_dict})
+    
+    # Update lead with the access check in the filter; the unique email
+    # index rejects an email another lead already has
+    try:
+        existing_lead, updated_lead = await update_scoped(
+            leads_collection, ObjectId(lead_id), scope, update_dict,
+            not_found_detail="Lead not found", projection=LEAD_PROJECTION
         )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Lead with this email already exists")
     
-    # Get updated lead
-    updated_lead = await leads_collection.find_one({"_id": ObjectId(lead_id)})
-    
-    # Convert ObjectId to string
-    updated_lead["id"] = str(updated_lead["_id"])
-    del updated_lead["_id"]
-    if "assigned_agent_id" in updated_lead and updated_lead["assigned_agent_id"]:
-        updated_lead["assigned_agent_id"] = str(updated_lead["assigned_agent_id"])
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_lead_change(existing_lead, updated_lead)
+    await invalidate_dashboards(existing_lead, updated_lead)
+    await bump_generations("leads")
     
-    return {"lead": updated_lead}
+    return CRMJSONResponse({"lead": serialize_document(updated_lead, exclude=LEAD_INTERNAL_FIELDS)})
 
 
 @router.delete("/{lead_id}")
@@ -204,12 +350,14 @@ async def delete_lead(
     if not ObjectId.is_valid(lead_id):
         raise HTTPException(status_code=400, detail="Invalid lead ID")
     
-    # Check if lead exists
-    lead = await leads_collection.find_one({"_id": ObjectId(lead_id)})
+    # Delete lead
+    lead = await leads_collection.find_one_and_delete({"_id": ObjectId(lead_id)}, projection=LEAD_PROJECTION)
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    # Delete lead
-    await leads_collection.delete_one({"_id": ObjectId(lead_id)})
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_lead_change(lead, None)
+    await invalidate_dashboards(lead)
+    await bump_generations("leads")
     
     return {"success": True, "message": "Lead deleted successfully"}
\ No newline at end of file
@@ -1,24 +1,35 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
-from database.connection import sales_collection, leads_collection
+from database.connection import sales_collection, sale_events_collection, leads_collection
 from auth.middleware import get_current_user_data
 from models.sale import SaleCreate, SaleUpdate
+from utils.conditional import bump_generations, conditional_get
+from utils.dashboard_cache import invalidate_dashboards
+from utils.daily_metrics import track_sale_change
+from utils.timeline import record_sale_stage_change
+from utils.pagination import paginate, TotalMode, NEWEST_FIRST
+from utils.writes import update_scoped
+from utils.projections import list_projection, ViewMode
+from utils.exports import export_response, export_columns, ExportFormat
+from utils.serializers import CRMJSONResponse, serialize_document, serialize_documents
 from bson import ObjectId
 from datetime import datetime
-import math
+import asyncio
 
 router = APIRouter(prefix="/sales", tags=["Sales"])
 
+# Fields returned by view=summary: the list columns
+SALE_SUMMARY_FIELDS = (
+    "lead_id", "lead_name", "property", "agent", "agent_id", "stage",
+    "value", "value_cents", "probability", "expected_close", "last_activity", "created_at"
+)
 
-@router.get("/")
-async def get_sales(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
-    stage: Optional[str] = Query(None),
-    agent: Optional[str] = Query(None),
-    user_data: dict = Depends(get_current_user_data)
-):
-    """Get paginated sales with optional filters."""
+# Columns of a full CSV export
+SALE_EXPORT_FIELDS = SALE_SUMMARY_FIELDS
+
+
+def _sales_query(stage: Optional[str], agent: Optional[str], user_data: dict) -> dict:
+    """Filters and role scoping shared by the list and export routes."""
     
     # Build query
     query = {}
@@ -35,34 +46,60 @@ async def get_sales(
     if user_data.get("role") == "agent":
         query["agent_id"] = ObjectId(user_data.get("user_id"))
     
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
+    return query
+
+
+@router.get("/", dependencies=[Depends(conditional_get("sales"))])
+async def get_sales(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[TotalMode] = Query(None),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    stage: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get paginated sales with optional filters."""
+    
+    query = _sales_query(stage, agent, user_data)
+    
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, SALE_SUMMARY_FIELDS, NEWEST_FIRST)
+    
+    # Get sales and the requested total concurrently
+    sales, pagination = await paginate(
+        sales_collection, query, NEWEST_FIRST, page, limit,
+        cursor=cursor, include_total=include_total, projection=projection
+    )
     
-    # Get total count
-    total = await sales_collection.count_documents(query)
+    return CRMJSONResponse({"sales": serialize_documents(sales), **pagination})
+
+
+@router.get("/export")
+async def export_sales(
+    format: ExportFormat = Query("csv"),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    stage: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Stream every matching sale as a CSV or NDJSON download."""
     
-    # Get sales
-    cursor = sales_collection.find(query).skip(skip).limit(limit).sort("created_at", -1)
-    sales = await cursor.to_list(length=limit)
+    query = _sales_query(stage, agent, user_data)
     
-    # Convert ObjectIds to strings
-    for sale in sales:
-        sale["id"] = str(sale["_id"])
-        del sale["_id"]
-        sale["lead_id"] = str(sale["lead_id"])
-        if "agent_id" in sale and sale["agent_id"]:
-            sale["agent_id"] = str(sale["agent_id"])
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, SALE_SUMMARY_FIELDS, NEWEST_FIRST)
     
-    return {
-        "sales": sales,
-        "total": total,
-        "page": page,
-        "pages": math.ceil(total / limit),
-        "limit": limit
-    }
+    return export_response(
+        sales_collection, query, NEWEST_FIRST, format, "sales",
+        projection=projection, columns=export_columns(projection, SALE_EXPORT_FIELDS)
+    )
 
 
-@router.get("/{sale_id}")
+@router.get("/{sale_id}", dependencies=[Depends(conditional_get("sales"))])
 async def get_sale(
     sale_id: str,
     user_data: dict = Depends(get_current_user_data)
@@ -81,14 +118,7 @@ async def get_sale(
         if str(sale.get("agent_id")) != user_data.get("user_id"):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Convert ObjectIds to strings
-    sale["id"] = str(sale["_id"])
-    del sale["_id"]
-    sale["lead_id"] = str(sale["lead_id"])
-    if "agent_id" in sale and sale["agent_id"]:
-        sale["agent_id"] = str(sale["agent_id"])
-    
-    return {"sale": sale}
+    return CRMJSONResponse({"sale": serialize_document(sale)})
 
 
 @router.post("/")
@@ -133,20 +163,16 @@ async def create_sale(
     if isinstance(sale_dict.get("agent_id"), str):
         sale_dict["agent_id"] = ObjectId(sale_dict["agent_id"])
     
-    # Insert sale
-    result = await sales_collection.insert_one(sale_dict)
+    # Insert sale; the in-memory document is what was stored
+    await sales_collection.insert_one(sale_dict)
+    created_sale = sale_dict
     
-    # Get the created sale
-    created_sale = await sales_collection.find_one({"_id": result.inserted_id})
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_sale_change(None, created_sale)
+    await invalidate_dashboards(created_sale)
+    await bump_generations("sales")
     
-    # Convert ObjectIds to strings
-    created_sale["id"] = str(created_sale["_id"])
-    del created_sale["_id"]
-    created_sale["lead_id"] = str(created_sale["lead_id"])
-    if "agent_id" in created_sale and created_sale["agent_id"]:
-        created_sale["agent_id"] = str(created_sale["agent_id"])
-    
-    return {"sale": created_sale}
+    return CRMJSONResponse({"sale": serialize_document(created_sale)})
 
 
 @router.put("/{sale_id}")
@@ -160,15 +186,10 @@ async def update_sale(
     if not ObjectId.is_valid(sale_id):
         raise HTTPException(status_code=400, detail="Invalid sale ID")
     
-    # Check if sale exists
-    existing_sale = await sales_collection.find_one({"_id": ObjectId(sale_id)})
-    if not existing_sale:
-        raise HTTPException(status_code=404, detail="Sale not found")
-    
     # Role-based access: agents can only update their own sales
+    scope = {}
     if user_data.get("role") == "agent":
-        if str(existing_sale.get("agent_id")) != user_data.get("user_id"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        scope["agent_id"] = ObjectId(user_data.get("user_id"))
     
     # Prepare update data
     update_dict = sale_data.dict(by_alias=True, exclude_unset=True)
@@ -180,24 +201,22 @@ async def update_sale(
             update_dict["lead_id"] = ObjectId(update_dict["lead_id"])
         if "agent_id" in update_dict and isinstance(update_dict["agent_id"], str):
             update_dict["agent_id"] = ObjectId(update_dict["agent_id"])
-        
-        # Update sale
-        await sales_collection.update_one(
-            {"_id": ObjectId(sale_id)},
-            {"$set": update_dict}
-        )
     
-    # Get updated sale
-    updated_sale = await sales_collection.find_one({"_id": ObjectId(sale_id)})
-    
-    # Convert ObjectIds to strings
-    updated_sale["id"] = str(updated_sale["_id"])
-    del updated_sale["_id"]
-    updated_sale["lead_id"] = str(updated_sale["lead_id"])
-    if "agent_id" in updated_sale and updated_sale["agent_id"]:
-        updated_sale["agent_id"] = str(updated_sale["agent_id"])
-    
-    return {"sale": updated_sale}
+    # Update sale with the access check in the filter
+    existing_sale, updated_sale = await update_scoped(
+        sales_collection, ObjectId(sale_id), scope, update_dict,
+        not_found_detail="Sale not found"
+    )
+    
+    # Update dashboard metrics rollup and the lead timeline, then drop cached dashboards
+    await asyncio.gather(
+        track_sale_change(existing_sale, updated_sale),
+        record_sale_stage_change(existing_sale, updated_sale)
+    )
+    await invalidate_dashboards(existing_sale, updated_sale)
+    await bump_generations("sales")
+    
+    return CRMJSONResponse({"sale": serialize_document(updated_sale)})
 
 
 @router.delete("/{sale_id}")
@@ -214,12 +233,17 @@ async def delete_sale(
     if not ObjectId.is_valid(sale_id):
         raise HTTPException(status_code=400, detail="Invalid sale ID")
     
-    # Check if sale exists
-    sale = await sales_collection.find_one({"_id": ObjectId(sale_id)})
+    # Delete sale
+    sale = await sales_collection.find_one_and_delete({"_id": ObjectId(sale_id)})
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
     
-    # Delete sale
-    await sales_collection.delete_one({"_id": ObjectId(sale_id)})
+    # Update dashboard metrics rollup and drop the sale's timeline events and cached dashboards
+    await asyncio.gather(
+        track_sale_change(sale, None),
+        sale_events_collection.delete_many({"sale_id": sale["_id"]})
+    )
+    await invalidate_dashboards(sale)
+    await bump_generations("sales")
     
     return {"success": True, "message": "Sale deleted successfully"}
\ No newline at end of file
@@ -3,23 +3,34 @@ from typing import List, Optional
 from database.connection import viewings_collection, leads_collection
 from auth.middleware import get_current_user_data
 from models.viewing import ViewingCreate, ViewingUpdate
+from utils.conditional import bump_generations, conditional_get
+from utils.dashboard_cache import invalidate_dashboards
+from utils.daily_metrics import track_viewing_change
+from utils.pagination import paginate, TotalMode
+from utils.writes import update_scoped
+from utils.projections import list_projection, ViewMode
+from utils.exports import export_response, export_columns, ExportFormat
+from utils.serializers import CRMJSONResponse, serialize_document, serialize_documents
 from bson import ObjectId
 from datetime import datetime
-import math
 
 router = APIRouter(prefix="/viewings", tags=["Viewings"])
 
+# Fields returned by view=summary: the list columns; omits address and creation metadata
+VIEWING_SUMMARY_FIELDS = (
+    "property", "date", "time", "lead_name", "leadName", "lead_id",
+    "agent", "agent_id", "status", "price", "price_cents", "type"
+)
 
-@router.get("/")
-async def get_viewings(
-    page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100),
-    date: Optional[str] = Query(None),
-    status: Optional[str] = Query(None),
-    agent: Optional[str] = Query(None),
-    user_data: dict = Depends(get_current_user_data)
-):
-    """Get paginated viewings with optional filters."""
+# Columns of a full CSV export
+VIEWING_EXPORT_FIELDS = VIEWING_SUMMARY_FIELDS + ("address", "created_at")
+
+# Viewings are listed by date (soonest first), with _id as a unique tie-breaker
+VIEWINGS_SORT = [("date", 1), ("_id", 1)]
+
+
+def _viewings_query(date: Optional[str], status: Optional[str], agent: Optional[str], user_data: dict) -> dict:
+    """Filters and role scoping shared by the list and export routes."""
     
     # Build query
     query = {}
@@ -40,35 +51,62 @@ async def get_viewings(
     if user_data.get("role") == "agent":
         query["agent_id"] = ObjectId(user_data.get("user_id"))
     
-    # Calculate skip value for pagination
-    skip = (page - 1) * limit
+    return query
+
+
+@router.get("/", dependencies=[Depends(conditional_get("viewings"))])
+async def get_viewings(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[TotalMode] = Query(None),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    date: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Get paginated viewings with optional filters."""
+    
+    query = _viewings_query(date, status, agent, user_data)
     
-    # Get total count
-    total = await viewings_collection.count_documents(query)
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, VIEWING_SUMMARY_FIELDS, VIEWINGS_SORT)
     
-    # Get viewings
-    cursor = viewings_collection.find(query).skip(skip).limit(limit).sort("date", 1)
-    viewings = await cursor.to_list(length=limit)
+    # Get viewings and the requested total concurrently
+    viewings, pagination = await paginate(
+        viewings_collection, query, VIEWINGS_SORT, page, limit,
+        cursor=cursor, include_total=include_total, projection=projection
+    )
+    
+    return CRMJSONResponse({"viewings": serialize_documents(viewings), **pagination})
+
+
+@router.get("/export")
+async def export_viewings(
+    format: ExportFormat = Query("csv"),
+    view: ViewMode = Query("full"),
+    fields: Optional[str] = Query(None),
+    date: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    agent: Optional[str] = Query(None),
+    user_data: dict = Depends(get_current_user_data)
+):
+    """Stream every matching viewing as a CSV or NDJSON download."""
     
-    # Convert ObjectIds to strings
-    for viewing in viewings:
-        viewing["id"] = str(viewing["_id"])
-        del viewing["_id"]
-        if "lead_id" in viewing and viewing["lead_id"]:
-            viewing["lead_id"] = str(viewing["lead_id"])
-        if "agent_id" in viewing and viewing["agent_id"]:
-            viewing["agent_id"] = str(viewing["agent_id"])
+    query = _viewings_query(date, status, agent, user_data)
     
-    return {
-        "viewings": viewings,
-        "total": total,
-        "page": page,
-        "pages": math.ceil(total / limit),
-        "limit": limit
-    }
+    # Only fetch the requested view of each document
+    projection = list_projection(view, fields, VIEWING_SUMMARY_FIELDS, VIEWINGS_SORT)
+    
+    return export_response(
+        viewings_collection, query, VIEWINGS_SORT, format, "viewings",
+        projection=projection, columns=export_columns(projection, VIEWING_EXPORT_FIELDS)
+    )
 
 
-@router.get("/{viewing_id}")
+@router.get("/{viewing_id}", dependencies=[Depends(conditional_get("viewings"))])
 async def get_viewing(
     viewing_id: str,
     user_data: dict = Depends(get_current_user_data)
@@ -87,15 +125,7 @@ async def get_viewing(
         if str(viewing.get("agent_id")) != user_data.get("user_id"):
             raise HTTPException(status_code=403, detail="Access denied")
     
-    # Convert ObjectIds to strings
-    viewing["id"] = str(viewing["_id"])
-    del viewing["_id"]
-    if "lead_id" in viewing and viewing["lead_id"]:
-        viewing["lead_id"] = str(viewing["lead_id"])
-    if "agent_id" in viewing and viewing["agent_id"]:
-        viewing["agent_id"] = str(viewing["agent_id"])
-    
-    return {"viewing": viewing}
+    return CRMJSONResponse({"viewing": serialize_document(viewing)})
 
 
 @router.post("/")
@@ -135,21 +165,16 @@ async def create_viewing(
     if isinstance(viewing_dict.get("agent_id"), str):
         viewing_dict["agent_id"] = ObjectId(viewing_dict["agent_id"])
     
-    # Insert viewing
-    result = await viewings_collection.insert_one(viewing_dict)
-    
-    # Get the created viewing
-    created_viewing = await viewings_collection.find_one({"_id": result.inserted_id})
+    # Insert viewing; the in-memory document is what was stored
+    await viewings_collection.insert_one(viewing_dict)
+    created_viewing = viewing_dict
     
-    # Convert ObjectIds to strings
-    created_viewing["id"] = str(created_viewing["_id"])
-    del created_viewing["_id"]
-    if "lead_id" in created_viewing and created_viewing["lead_id"]:
-        created_viewing["lead_id"] = str(created_viewing["lead_id"])
-    if "agent_id" in created_viewing and created_viewing["agent_id"]:
-        created_viewing["agent_id"] = str(created_viewing["agent_id"])
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_viewing_change(None, created_viewing)
+    await invalidate_dashboards(created_viewing)
+    await bump_generations("viewings")
     
-    return {"viewing": created_viewing}
+    return CRMJSONResponse({"viewing": serialize_document(created_viewing)})
 
 
 @router.put("/{viewing_id}")
@@ -163,15 +188,10 @@ async def update_viewing(
     if not ObjectId.is_valid(viewing_id):
         raise HTTPException(status_code=400, detail="Invalid viewing ID")
     
-    # Check if viewing exists
-    existing_viewing = await viewings_collection.find_one({"_id": ObjectId(viewing_id)})
-    if not existing_viewing:
-        raise HTTPException(status_code=404, detail="Viewing not found")
-    
     # Role-based access: agents can only update their own viewings
+    scope = {}
     if user_data.get("role") == "agent":
-        if str(existing_viewing.get("agent_id")) != user_data.get("user_id"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        scope["agent_id"] = ObjectId(user_data.get("user_id"))
     
     # Prepare update data
     update_dict = viewing_data.dict(by_alias=True, exclude_unset=True)
@@ -181,25 +201,19 @@ async def update_viewing(
             update_dict["lead_id"] = ObjectId(update_dict["lead_id"])
         if "agent_id" in update_dict and update_dict["agent_id"] and isinstance(update_dict["agent_id"], str):
             update_dict["agent_id"] = ObjectId(update_dict["agent_id"])
-        
-        # Update viewing
-        await viewings_collection.update_one(
-            {"_id": ObjectId(viewing_id)},
-            {"$set": update_dict}
-        )
     
-    # Get updated viewing
-    updated_viewing = await viewings_collection.find_one({"_id": ObjectId(viewing_id)})
+    # Update viewing with the access check in the filter
+    existing_viewing, updated_viewing = await update_scoped(
+        viewings_collection, ObjectId(viewing_id), scope, update_dict,
+        not_found_detail="Viewing not found"
+    )
     
-    # Convert ObjectIds to strings
-    updated_viewing["id"] = str(updated_viewing["_id"])
-    del updated_viewing["_id"]
-    if "lead_id" in updated_viewing and updated_viewing["lead_id"]:
-        updated_viewing["lead_id"] = str(updated_viewing["lead_id"])
-    if "agent_id" in updated_viewing and updated_viewing["agent_id"]:
-        updated_viewing["agent_id"] = str(updated_viewing["agent_id"])
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_viewing_change(existing_viewing, updated_viewing)
+    await invalidate_dashboards(existing_viewing, updated_viewing)
+    await bump_generations("viewings")
     
-    return {"viewing": updated_viewing}
+    return CRMJSONResponse({"viewing": serialize_document(updated_viewing)})
 
 
 @router.delete("/{viewing_id}")
@@ -216,12 +230,14 @@ async def delete_viewing(
     if not ObjectId.is_valid(viewing_id):
         raise HTTPException(status_code=400, detail="Invalid viewing ID")
     
-    # Check if viewing exists
-    viewing = await viewings_collection.find_one({"_id": ObjectId(viewing_id)})
+    # Delete viewing
+    viewing = await viewings_collection.find_one_and_delete({"_id": ObjectId(viewing_id)})
     if not viewing:
         raise HTTPException(status_code=404, detail="Viewing not found")
     
-    # Delete viewing
-    await viewings_collection.delete_one({"_id": ObjectId(viewing_id)})
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_viewing_change(viewing, None)
+    await invalidate_dashboards(viewing)
+    await bump_generations("viewings")
     
     return {"success": True, "message": "Viewing deleted successfully"}
\ No newline at end of file
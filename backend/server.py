@@ -1,6 +1,7 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
 import logging
 from pathlib import Path
@@ -10,6 +11,10 @@ import sys
 # Add the backend directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
+# Load settings before importing modules that read them at import time
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
 # Import routes
 from routes.auth import router as auth_router
 from routes.leads import router as leads_router
@@ -18,13 +23,19 @@ from routes.viewings import router as viewings_router
 from routes.sales import router as sales_router
 from routes.dashboard import router as dashboard_router
 from routes.emails import router as emails_router
+from routes.events import router as events_router
 
-# Import database and utilities
-from database.connection import ping_database, create_indexes, close_database_connection
-from utils.seed_data import seed_database
+from auth.middleware import verify_admin_role
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Import database and utilities
+from database.connection import ping_database, close_database_connection, get_pool_status
+from database.indexes import reconcile_indexes
+from utils.migrations import run_startup_migrations
+from utils.email_queue import EmailWorkerPool, EMAIL_WORKERS_IN_APP
+from utils.change_feed import change_feed, CHANGE_FEED_ENABLED
+from utils.conditional import ETagMiddleware, NotModified, not_modified_handler
+from utils.serializers import CRMJSONResponse, validation_error_handler
+from fastapi.exceptions import RequestValidationError
 
 # Configure logging
 logging.basicConfig(
@@ -34,28 +45,49 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+async def prepare_database():
+    """Check the database connection, reconcile indexes and migrate data in the background."""
+    if not await ping_database():
+        logger.error("Failed to connect to database")
+        return
+    
+    logger.info("Database connection successful")
+    
+    # Create missing indexes and report obsolete ones
+    try:
+        await reconcile_indexes(drop_obsolete=os.environ.get('DROP_OBSOLETE_INDEXES', '').lower() == 'true')
+    except Exception:
+        logger.exception("Index reconciliation failed")
+    
+    # Backfill data written by earlier versions (no-ops once done)
+    await run_startup_migrations()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle application startup and shutdown."""
-    # Startup
+    # Startup: serve immediately; database preparation runs in the background.
+    # Seeding is an explicit command: python manage.py seed
     logger.info("Starting Rich Man Dream CRM Backend...")
+    prepare_task = asyncio.create_task(prepare_database())
     
-    # Test database connection
-    if await ping_database():
-        logger.info("Database connection successful")
-        
-        # Create indexes
-        await create_indexes()
-        
-        # Seed database with initial data
-        await seed_database()
-    else:
-        logger.error("Failed to connect to database")
+    # Outbound email workers (or run them separately: python manage.py email-worker)
+    email_workers = EmailWorkerPool() if EMAIL_WORKERS_IN_APP else None
+    if email_workers:
+        email_workers.start()
+    
+    # Change stream watcher pushing live updates to /api/events/stream subscribers
+    if CHANGE_FEED_ENABLED:
+        change_feed.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down Rich Man Dream CRM Backend...")
+    prepare_task.cancel()
+    if email_workers:
+        await email_workers.stop()
+    await change_feed.stop()
     await close_database_connection()
 
 
@@ -64,7 +96,8 @@ app = FastAPI(
     title="Rich Man Dream CRM API",
     description="Premium Real Estate CRM Backend",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=CRMJSONResponse
 )
 
 # Create a router with the /api prefix
@@ -90,6 +123,12 @@ async def health_check():
     }
 
 
+@api_router.get("/health/pool")
+async def pool_status(user_data: dict = Depends(verify_admin_role)):
+    """MongoDB connection pool configuration and statistics (admin only)."""
+    return get_pool_status()
+
+
 # Include all routes
 api_router.include_router(auth_router)
 api_router.include_router(leads_router)
@@ -98,10 +137,17 @@ api_router.include_router(viewings_router)
 api_router.include_router(sales_router)
 api_router.include_router(dashboard_router)
 api_router.include_router(emails_router)
+api_router.include_router(events_router)
 
 # Include the API router in the main app
 app.include_router(api_router)
 
+app.add_exception_handler(RequestValidationError, validation_error_handler)
+
+# Conditional GET: 304 for unchanged reads, ETag on the rest
+app.add_exception_handler(NotModified, not_modified_handler)
+app.add_middleware(ETagMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -109,4 +155,5 @@ app.add_middleware(
     allow_origins=["*"],  # In production, specify actual origins
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
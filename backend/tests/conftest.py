@@ -0,0 +1,11 @@
+import sys
+from pathlib import Path
+
+import motor.motor_asyncio
+from mongomock_motor import AsyncMongoMockClient
+
+# Tests import the backend modules the same way server.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# database.connection creates its client at import: point it at an in-memory server
+motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
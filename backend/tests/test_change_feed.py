@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import utils.change_feed as change_feed_module
+from utils.change_feed import ChangeFeed
+
+
+class OldServer:
+    """Rejects pre-images like MongoDB 5.0 and stops the watcher on the next attempt."""
+    
+    def __init__(self):
+        self.attempts = []
+    
+    def watch(self, pipeline, **options):
+        self.attempts.append(options)
+        if "full_document_before_change" in options:
+            raise OperationFailure("BSON field '$changeStream.fullDocumentBeforeChange' is an unknown field.", code=40415)
+        raise asyncio.CancelledError
+
+
+def test_watcher_retries_without_pre_images_on_old_servers(monkeypatch):
+    server = OldServer()
+    monkeypatch.setattr(change_feed_module, "database", server)
+    feed = ChangeFeed()
+    
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(feed.run_forever())
+    
+    assert not feed.pre_images
+    assert ["full_document_before_change" in options for options in server.attempts] == [True, False]
+
+
+ANN = {"user_id": "65a1b2c3d4e5f6789abcdef1", "role": "agent"}
+BOB = {"user_id": "65a1b2c3d4e5f6789abcdef2", "role": "agent"}
+ADMIN = {"user_id": "65a1b2c3d4e5f6789abcdef3", "role": "admin"}
+ALL = frozenset(change_feed_module.LIVE_COLLECTIONS)
+
+
+def lead(agent: dict) -> dict:
+    return {"_id": "lead-1", "name": "Jane Buyer", "assigned_agent_id": agent["user_id"], "search_tokens": ["jane"]}
+
+
+def change(token: str, operation: str, document: dict = None, before: dict = None, collection: str = "leads") -> dict:
+    raw = {
+        "_id": {"_data": token},
+        "operationType": operation,
+        "ns": {"db": "crm", "coll": collection},
+        "documentKey": {"_id": "lead-1"}
+    }
+    if document is not None:
+        raw["fullDocument"] = document
+    if before is not None:
+        raw["fullDocumentBeforeChange"] = before
+    return raw
+
+
+def received(subscriber) -> list:
+    events = []
+    while not subscriber.queue.empty():
+        event = subscriber.queue.get_nowait()
+        events.append(event.payload(subscriber.user_data))
+    return events
+
+
+def subscribed(feed: ChangeFeed, *users: dict, collections: frozenset = ALL) -> list:
+    return [feed.subscribe(user, collections)[0] for user in users]
+
+
+def test_agents_receive_only_their_own_leads():
+    feed = ChangeFeed()
+    ann, bob, admin = subscribed(feed, ANN, BOB, ADMIN)
+    
+    feed.publish(change("1", "insert", lead(ANN)))
+    
+    [event] = received(ann)
+    assert event["operation"] == "insert" and event["document"]["assigned_agent_id"] == ANN["user_id"]
+    assert "search_tokens" not in event["document"]
+    assert received(bob) == []
+    assert len(received(admin)) == 1
+
+
+def test_subscribers_only_receive_requested_collections():
+    feed = ChangeFeed()
+    [admin] = subscribed(feed, ADMIN, collections=frozenset({"sales"}))
+    
+    feed.publish(change("1", "insert", lead(ANN)))
+    
+    assert received(admin) == []
+
+
+def test_reassigned_lead_reaches_previous_agent_without_its_new_state():
+    feed = ChangeFeed()
+    ann, bob = subscribed(feed, ANN, BOB)
+    
+    feed.publish(change("1", "update", lead(BOB), before=lead(ANN)))
+    
+    [moved_away] = received(ann)
+    assert moved_away["operation"] == "update" and moved_away["document"] is None
+    [moved_in] = received(bob)
+    assert moved_in["document"]["assigned_agent_id"] == BOB["user_id"]
+
+
+def test_reassignment_without_pre_image_reaches_new_agent_only():
+    feed = ChangeFeed()
+    ann, bob = subscribed(feed, ANN, BOB)
+    
+    feed.publish(change("1", "update", lead(BOB)))
+    
+    assert received(ann) == []
+    assert len(received(bob)) == 1
+
+
+def test_delete_is_scoped_by_its_pre_image():
+    feed = ChangeFeed()
+    ann, bob, admin = subscribed(feed, ANN, BOB, ADMIN)
+    
+    feed.publish(change("1", "delete", before=lead(ANN)))
+    
+    [deleted] = received(ann)
+    assert deleted["operation"] == "delete" and deleted["id"] == "lead-1" and deleted["document"] is None
+    assert received(bob) == []
+    assert len(received(admin)) == 1
+
+
+def test_delete_without_pre_image_reaches_non_agents_only():
+    feed = ChangeFeed()
+    ann, bob, admin = subscribed(feed, ANN, BOB, ADMIN)
+    
+    feed.publish(change("1", "delete"))
+    
+    assert received(ann) == [] and received(bob) == []
+    assert len(received(admin)) == 1
+
+
+def test_replay_is_scoped_like_live_events():
+    feed = ChangeFeed()
+    feed.publish(change("1", "insert", lead(ANN)))
+    feed.publish(change("2", "update", lead(BOB)))
+    feed.publish(change("3", "update", lead(ANN)))
+    
+    _, missed = feed.subscribe(BOB, ALL, last_event_id="1")
+    assert [event.token for event in missed] == ["2"]
+    _, missed = feed.subscribe(ANN, ALL, last_event_id="1")
+    assert [event.token for event in missed] == ["3"]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from auth.middleware import get_current_user_data
+from database.connection import write_generations_collection
+from utils.conditional import ETagMiddleware, NotModified, bump_generations, conditional_get, not_modified_handler
+
+AGENT = {"sub": "ann@example.com", "user_id": "65a1b2c3d4e5f6789abcdef1", "role": "agent"}
+OTHER_AGENT = {"sub": "bob@example.com", "user_id": "65a1b2c3d4e5f6789abcdef2", "role": "agent"}
+ADMIN = {"sub": "eve@example.com", "user_id": AGENT["user_id"], "role": "admin"}
+
+
+@pytest.fixture
+def client():
+    asyncio.run(write_generations_collection.delete_many({}))
+    current = {"user": AGENT}
+    
+    app = FastAPI()
+    app.add_exception_handler(NotModified, not_modified_handler)
+    app.add_middleware(ETagMiddleware)
+    app.dependency_overrides[get_current_user_data] = lambda: current["user"]
+    
+    @app.get("/leads/", dependencies=[Depends(conditional_get("leads"))])
+    async def get_leads():
+        return {"leads": []}
+    
+    with TestClient(app) as test_client:
+        test_client.current = current
+        yield test_client
+
+
+def test_matching_if_none_match_is_not_modified(client):
+    first = client.get("/leads/")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "private, no-cache"
+    
+    cached = client.get("/leads/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == etag
+    
+    assert client.get("/leads/", headers={"If-None-Match": 'W/"stale"'}).status_code == 200
+
+
+def test_lead_write_changes_the_etag(client):
+    etag = client.get("/leads/").headers["ETag"]
+    
+    # What every lead write handler does after changing the collection
+    asyncio.run(bump_generations("leads"))
+    
+    refreshed = client.get("/leads/", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.headers["ETag"] != etag
+    
+    # Writes to collections the route does not depend on keep the copy valid
+    asyncio.run(bump_generations("sales"))
+    assert client.get("/leads/", headers={"If-None-Match": refreshed.headers["ETag"]}).status_code == 304
+
+
+def test_etag_is_scoped_to_the_caller(client):
+    etags = {}
+    for user in (AGENT, OTHER_AGENT, ADMIN):
+        client.current["user"] = user
+        etags[user["sub"]] = client.get("/leads/").headers["ETag"]
+    
+    assert len(set(etags.values())) == 3
+    
+    # Another user's cached copy never validates, even for the same role or id
+    client.current["user"] = OTHER_AGENT
+    assert client.get("/leads/", headers={"If-None-Match": etags[AGENT["sub"]]}).status_code == 200
+    client.current["user"] = ADMIN
+    assert client.get("/leads/", headers={"If-None-Match": etags[AGENT["sub"]]}).status_code == 200
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from database.connection import daily_metrics_collection, leads_collection
+from utils.daily_metrics import ensure_daily_metrics, lead_metrics
+
+
+def test_undated_lead_is_counted_in_the_undated_row():
+    agent_id = ObjectId()
+    assert lead_metrics({"assigned_agent_id": agent_id, "status": "hot"}) == [
+        (agent_id, None, {"leads_created": 1, "leads_hot": 1})
+    ]
+    assert lead_metrics({"assigned_agent_id": agent_id, "created_at": datetime(2024, 5, 6, 14, 30)}) == [
+        (agent_id, datetime(2024, 5, 6), {"leads_created": 1})
+    ]
+
+
+def test_ensure_daily_metrics_builds_an_empty_rollup_once():
+    agent_id = ObjectId()
+    
+    async def scenario():
+        await daily_metrics_collection.delete_many({})
+        await leads_collection.delete_many({})
+        await leads_collection.insert_many([
+            {"assigned_agent_id": agent_id, "status": "warm", "created_at": datetime(2024, 5, 6)},
+            {"assigned_agent_id": agent_id, "status": "warm", "created_at": "yesterday"}
+        ])
+        built = await ensure_daily_metrics()
+        rows = await daily_metrics_collection.find({}, {"_id": 0}).sort("day", 1).to_list(length=None)
+        return built, rows, await ensure_daily_metrics()
+    
+    built, rows, rebuilt = asyncio.run(scenario())
+    assert built == 2
+    assert [(row["day"], row["leads_warm"]) for row in rows] == [(None, 1), (datetime(2024, 5, 6), 1)]
+    assert rebuilt == 0
@@ -0,0 +1,118 @@
+import asyncio
+
+from utils.dashboard_cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache
+
+
+class FakeRedis:
+    """The few redis.asyncio calls RedisCacheBackend makes, in memory and without expiry."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+    
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+    
+    def incr(self, key):
+        self.commands.append(lambda: self.redis.data.__setitem__(key, str(int(self.redis.data.get(key, 0)) + 1)))
+    
+    def delete(self, *keys):
+        self.commands.append(lambda: [self.redis.data.pop(key, None) for key in keys])
+    
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+
+def redis_backend() -> RedisCacheBackend:
+    backend = RedisCacheBackend.__new__(RedisCacheBackend)
+    backend._client = FakeRedis()
+    return backend
+
+
+def overtaken_by_invalidation(backend) -> tuple:
+    """Worker A computes while worker B invalidates; both share `backend`."""
+    worker_a, worker_b = ResponseCache(backend, ttl=30), ResponseCache(backend, ttl=30)
+    
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+        
+        async def stale():
+            started.set()
+            await release.wait()
+            return {"v": 1}
+        
+        async def fresh():
+            return {"v": 2}
+        
+        pending = asyncio.ensure_future(worker_a.get_or_compute("k", stale))
+        await started.wait()
+        await worker_b.delete(["k"])
+        release.set()
+        first = await pending
+        return first, await worker_a.get_or_compute("k", fresh), await worker_b.get_or_compute("k", fresh)
+    
+    return asyncio.run(scenario())
+
+
+def test_memory_backend_does_not_serve_computation_overtaken_by_invalidation():
+    assert overtaken_by_invalidation(MemoryCacheBackend()) == ({"v": 1}, {"v": 2}, {"v": 2})
+
+
+def test_redis_backend_does_not_serve_computation_overtaken_by_invalidation():
+    assert overtaken_by_invalidation(redis_backend()) == ({"v": 1}, {"v": 2}, {"v": 2})
+
+
+def test_request_after_invalidation_does_not_join_older_computation():
+    cache = ResponseCache(MemoryCacheBackend(), ttl=30)
+    
+    async def scenario():
+        release = asyncio.Event()
+        
+        async def stale():
+            await release.wait()
+            return {"v": 1}
+        
+        async def fresh():
+            return {"v": 2}
+        
+        pending = asyncio.ensure_future(cache.get_or_compute("k", stale))
+        await asyncio.sleep(0)
+        await cache.delete(["k"])
+        later = await cache.get_or_compute("k", fresh)
+        release.set()
+        return await pending, later
+    
+    assert asyncio.run(scenario()) == ({"v": 1}, {"v": 2})
+
+
+def test_memory_versions_are_bounded_and_never_reused():
+    backend = MemoryCacheBackend(max_versions=2)
+    
+    async def scenario():
+        _, before = await backend.get("a")
+        await backend.bump(["a"])
+        await backend.bump(["b", "c"])
+        await backend.set("a", {"v": 1}, before, ttl=30)
+        return await backend.get("a")
+    
+    value, version = asyncio.run(scenario())
+    assert len(backend._versions) == 2
+    assert value is None and version != 0
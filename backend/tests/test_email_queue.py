@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.connection import email_outbox_collection, emails_collection
+from utils import email_queue
+from utils.email_queue import claim_job, enqueue_email, process_job
+from utils.email_transport import MemoryTransport, PermanentEmailError
+
+
+class FailingTransport:
+    def __init__(self, error: Exception):
+        self.error = error
+    
+    async def send(self, message: dict):
+        raise self.error
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def _queue_one() -> dict:
+    await email_outbox_collection.delete_many({})
+    await emails_collection.delete_many({})
+    email = {"to_email": "ann@example.com", "from_email": "bob@example.com", "subject": "Hi", "content": "Hello", "status": "sent"}
+    await emails_collection.insert_one(email)
+    await enqueue_email(email)
+    return email
+
+
+async def _expire_lease(job: dict):
+    await email_outbox_collection.update_one({"_id": job["_id"]}, {"$set": {"available_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def _state(email: dict) -> tuple:
+    job = await email_outbox_collection.find_one({"email_id": email["_id"]})
+    stored = await emails_collection.find_one({"_id": email["_id"]})
+    return job, stored["status"]
+
+
+@pytest.fixture
+def email():
+    return run(_queue_one())
+
+
+def test_claim_leases_the_job(email):
+    async def scenario():
+        job = await claim_job("worker-a")
+        return job, await claim_job("worker-b")
+    
+    job, second = run(scenario())
+    assert job["email_id"] == email["_id"] and job["attempts"] == 1 and job["locked_by"] == "worker-a"
+    assert job["available_at"] > datetime.utcnow() + timedelta(seconds=email_queue.EMAIL_LEASE_SECONDS - 5)
+    assert second is None
+
+
+def test_delivered_job_is_marked_sent(email):
+    transport = MemoryTransport()
+    
+    async def scenario():
+        await process_job(await claim_job("worker-a"), transport)
+        return await _state(email)
+    
+    job, status = run(scenario())
+    assert job["status"] == "sent" and "locked_by" not in job and job["completed_at"]
+    assert status == "delivered"
+    assert transport.sent == [{"to_email": "ann@example.com", "from_email": "bob@example.com", "subject": "Hi", "content": "Hello"}]
+
+
+def test_transient_failure_is_retried_with_backoff(email):
+    async def scenario():
+        await process_job(await claim_job("worker-a"), FailingTransport(ConnectionError("timeout")))
+        return await _state(email), await claim_job("worker-a")
+    
+    (job, status), reclaimed = run(scenario())
+    assert job["status"] == "queued" and job["last_error"] == "timeout" and "locked_by" not in job
+    assert job["available_at"] > datetime.utcnow() + timedelta(seconds=email_queue.EMAIL_RETRY_BASE_SECONDS * 0.8)
+    assert status == "sent"
+    # Not due again before its backoff
+    assert reclaimed is None
+
+
+def test_job_fails_after_the_last_attempt(email, monkeypatch):
+    monkeypatch.setattr(email_queue, "EMAIL_MAX_ATTEMPTS", 2)
+    transport = FailingTransport(ConnectionError("timeout"))
+    
+    async def scenario():
+        for _ in range(2):
+            job = await claim_job("worker-a")
+            await process_job(job, transport)
+            await _expire_lease(job)
+        return await _state(email)
+    
+    job, status = run(scenario())
+    assert job["status"] == "failed" and job["attempts"] == 2
+    assert status == "failed"
+
+
+def test_permanent_failure_is_not_retried(email):
+    async def scenario():
+        await process_job(await claim_job("worker-a"), FailingTransport(PermanentEmailError("no such user")))
+        return await _state(email)
+    
+    job, status = run(scenario())
+    assert job["status"] == "failed" and job["attempts"] == 1 and job["last_error"] == "no such user"
+    assert status == "failed"
+
+
+def test_expired_lease_is_claimed_again_and_stale_outcome_ignored(email):
+    transport = MemoryTransport()
+    
+    async def scenario():
+        stalled = await claim_job("worker-a")
+        await _expire_lease(stalled)
+        retaken = await claim_job("worker-b")
+        # The first worker finishes late: its outcome must not settle the retaken job
+        await process_job(stalled, FailingTransport(PermanentEmailError("late")))
+        after_stale, _ = await _state(email)
+        await process_job(retaken, transport)
+        return retaken, after_stale, await _state(email)
+    
+    retaken, after_stale, (job, status) = run(scenario())
+    assert retaken["locked_by"] == "worker-b" and retaken["attempts"] == 2
+    assert after_stale["status"] == "queued" and after_stale["locked_by"] == "worker-b"
+    assert job["status"] == "sent"
+    assert len(transport.sent) == 1
@@ -0,0 +1,33 @@
+from pymongo import ASCENDING, IndexModel
+
+from database.indexes import _same_definition
+
+PARTIAL = {"campaign_id": {"$exists": True}}
+
+
+def existing(model: IndexModel, **changes) -> dict:
+    """index_information() entry for a model, with some options changed."""
+    info = {key: value for key, value in model.document.items() if key not in ("name", "key")}
+    info["key"] = list(model.document["key"].items())
+    info.update(changes)
+    return {key: value for key, value in info.items() if value is not None}
+
+
+def test_same_definition_matches_identical_index():
+    model = IndexModel([("campaign_id", ASCENDING)], unique=True, partialFilterExpression=PARTIAL)
+    assert _same_definition(model, existing(model))
+
+
+def test_changed_partial_filter_or_ttl_is_a_different_definition():
+    partial = IndexModel([("campaign_id", ASCENDING)], unique=True, partialFilterExpression=PARTIAL)
+    assert not _same_definition(partial, existing(partial, partialFilterExpression={"campaign_id": {"$type": "objectId"}}))
+    assert not _same_definition(partial, existing(partial, partialFilterExpression=None))
+    
+    ttl = IndexModel([("completed_at", ASCENDING)], expireAfterSeconds=3600)
+    assert not _same_definition(ttl, existing(ttl, expireAfterSeconds=60))
+    assert not _same_definition(ttl, existing(ttl, expireAfterSeconds=None))
+
+
+def test_changed_unique_flag_is_a_different_definition():
+    model = IndexModel([("email", ASCENDING)], unique=True)
+    assert not _same_definition(model, existing(model, unique=None))
@@ -0,0 +1,98 @@
+import asyncio
+
+from utils import lead_import
+from utils.lead_import import _csv_rows, _iter_lines, _ndjson_rows
+
+
+async def _chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def parse(parser, *parts: bytes) -> list:
+    async def collect():
+        return [row async for row in parser(_iter_lines(_chunks(*parts)))]
+    return asyncio.run(collect())
+
+
+HEADER = b"name,email,notes\n"
+
+
+def test_csv_rows_with_header():
+    rows = parse(_csv_rows, HEADER + b"Ann,ann@example.com,hi\nBob,bob@example.com,\n")
+    assert rows == [
+        (2, {"name": "Ann", "email": "ann@example.com", "notes": "hi"}, None),
+        (3, {"name": "Bob", "email": "bob@example.com"}, None)
+    ]
+
+
+def test_csv_stray_quote_in_unquoted_field_is_literal():
+    rows = parse(_csv_rows, HEADER + b"Ann,ann@example.com,5'10\" tall\nBob,bob@example.com,x\nCy,cy@example.com,y\n")
+    assert [(line, row["notes"], error) for line, row, error in rows] == [
+        (2, "5'10\" tall", None),
+        (3, "x", None),
+        (4, "y", None)
+    ]
+
+
+def test_csv_quoted_field_spanning_lines():
+    rows = parse(_csv_rows, HEADER + b'Ann,ann@example.com,"line one\nline two, with comma"\nBob,bob@example.com,x\n')
+    assert rows == [
+        (2, {"name": "Ann", "email": "ann@example.com", "notes": "line one\nline two, with comma"}, None),
+        (4, {"name": "Bob", "email": "bob@example.com", "notes": "x"}, None)
+    ]
+
+
+def test_csv_escaped_quotes_and_crlf():
+    rows = parse(_csv_rows, b'name,notes\r\n"Ann ""A"" Lee","say ""hi"""\r\n')
+    assert rows == [(2, {"name": 'Ann "A" Lee', "notes": 'say "hi"'}, None)]
+
+
+def test_csv_record_split_across_chunks():
+    rows = parse(_csv_rows, HEADER + b'Ann,ann@exa', b'mple.com,"multi\nli', b'ne"\n')
+    assert rows == [(2, {"name": "Ann", "email": "ann@example.com", "notes": "multi\nline"}, None)]
+
+
+def test_csv_blank_lines_skipped_and_last_line_without_newline():
+    rows = parse(_csv_rows, HEADER + b"\nAnn,ann@example.com,x\n\nBob,bob@example.com,y")
+    assert [line for line, _, _ in rows] == [3, 5]
+
+
+def test_csv_too_many_columns():
+    rows = parse(_csv_rows, HEADER + b"Ann,ann@example.com,x,extra\n")
+    assert rows == [(2, None, "Expected 3 columns, got 4")]
+
+
+def test_csv_unterminated_quoted_field():
+    rows = parse(_csv_rows, HEADER + b'Ann,ann@example.com,"never closed\nstill open\n')
+    assert rows == [(2, None, "Unterminated quoted field")]
+
+
+def test_csv_record_over_line_cap_is_invalid_and_parsing_resumes(monkeypatch):
+    monkeypatch.setattr(lead_import, "CSV_MAX_RECORD_LINES", 3)
+    body = HEADER + b'Ann,ann@example.com,"never closed\na\nb\nBob,bob@example.com,x\n'
+    assert parse(_csv_rows, body) == [
+        (2, None, "Record spans lines 2-4 without closing its quoted field"),
+        (5, {"name": "Bob", "email": "bob@example.com", "notes": "x"}, None)
+    ]
+
+
+def test_csv_record_over_byte_cap_is_invalid(monkeypatch):
+    monkeypatch.setattr(lead_import, "CSV_MAX_RECORD_BYTES", 64)
+    body = HEADER + b'Ann,ann@example.com,"' + b"x" * 40 + b"\n" + b"y" * 40 + b"\n"
+    assert parse(_csv_rows, body) == [(2, None, "Record spans lines 2-3 without closing its quoted field")]
+
+
+def test_csv_utf8_bom_and_multibyte_split():
+    body = "\ufeffname,notes\nZoë,café\n".encode("utf-8")
+    split = body.index("é".encode("utf-8")) + 1
+    rows = parse(_csv_rows, body[:split], body[split:])
+    assert rows == [(2, {"name": "Zoë", "notes": "café"}, None)]
+
+
+def test_ndjson_rows():
+    rows = parse(_ndjson_rows, b'{"name": "Ann"}\n\nnot json\n[1]\n{"name": "Bob"}')
+    assert rows[0] == (1, {"name": "Ann"}, None)
+    assert rows[1][0] == 3 and rows[1][1] is None and rows[1][2].startswith("Invalid JSON")
+    assert rows[2] == (4, None, "Expected a JSON object")
+    assert rows[3] == (5, {"name": "Bob"}, None)
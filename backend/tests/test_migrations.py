@@ -0,0 +1,38 @@
+import asyncio
+
+from database.connection import leads_collection, sales_collection, viewings_collection, write_generations_collection
+from utils.migrations import backfill_numeric_amounts, backfill_search_tokens
+from utils.search import lead_search_query
+
+
+def test_numeric_backfill_fills_missing_cents_and_bumps_generations():
+    async def scenario():
+        for collection in (leads_collection, sales_collection, viewings_collection, write_generations_collection):
+            await collection.delete_many({})
+        await leads_collection.insert_many([
+            {"name": "Ann", "budget": "$850K"},
+            {"name": "Bob", "budget": "$500K - $700K"},
+            {"name": "Cy", "budget": "$1M", "budget_cents": 1}
+        ])
+        await backfill_numeric_amounts()
+        leads = await leads_collection.find({}, {"_id": 0, "name": 1, "budget_cents": 1}).sort("name", 1).to_list(length=None)
+        generations = await write_generations_collection.find({}).to_list(length=None)
+        return leads, generations
+    
+    leads, generations = asyncio.run(scenario())
+    assert leads == [
+        {"name": "Ann", "budget_cents": 85_000_000},
+        {"name": "Bob", "budget_cents": None},
+        {"name": "Cy", "budget_cents": 1}
+    ]
+    assert generations == [{"_id": "leads", "generation": 1}]
+
+
+def test_search_token_backfill_makes_existing_leads_searchable():
+    async def scenario():
+        await leads_collection.delete_many({})
+        await leads_collection.insert_one({"name": "Ann Lee", "email": "ann@example.com", "phone": "555-0100"})
+        await backfill_search_tokens()
+        return await leads_collection.count_documents(lead_search_query("ann le"))
+    
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,19 @@
+import pytest
+
+from models.money import amount_to_cents
+
+
+@pytest.mark.parametrize("value, cents", [
+    ("$850,000", 85_000_000),
+    ("$1.2M", 120_000_000),
+    ("750k", 75_000_000),
+    (12.5, 1250),
+    (3, 300)
+])
+def test_amount_to_cents(value, cents):
+    assert amount_to_cents(value) == cents
+
+
+@pytest.mark.parametrize("value", [None, "", "$500K - $700K", "call me", True, False, float("inf"), float("-inf"), float("nan")])
+def test_amount_to_cents_rejects_non_amounts(value):
+    assert amount_to_cents(value) is None
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from utils.pagination import NEWEST_FIRST, decode_cursor, encode_cursor, fetch_page
+
+
+def walk(collection, sort: list, limit: int) -> list:
+    """Page through a collection with cursors and return the ids in page order."""
+    async def collect():
+        ids, cursor = [], None
+        while True:
+            docs, cursor = await fetch_page(collection, {}, sort, limit, cursor=cursor)
+            ids += [doc["_id"] for doc in docs]
+            if cursor is None:
+                return ids
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def leads():
+    collection = AsyncMongoMockClient()["test"]["leads"]
+    start = datetime(2024, 1, 1)
+    docs = [{"_id": ObjectId(), "created_at": start + timedelta(days=day)} for day in range(3)]
+    docs += [{"_id": ObjectId()}, {"_id": ObjectId(), "created_at": None}]
+    asyncio.run(collection.insert_many(docs))
+    return collection
+
+
+@pytest.mark.parametrize("limit", [1, 2, 10])
+def test_keyset_pages_include_documents_without_sort_key(leads, limit):
+    async def unpaged(sort):
+        return [doc["_id"] for doc in await leads.find({}).sort(sort).to_list(length=None)]
+    
+    for sort in (NEWEST_FIRST, [("created_at", 1), ("_id", 1)]):
+        assert walk(leads, sort, limit) == asyncio.run(unpaged(sort))
+
+
+def test_cursor_round_trips_null_sort_key():
+    doc = {"_id": ObjectId()}
+    assert decode_cursor(encode_cursor(doc, NEWEST_FIRST), NEWEST_FIRST) == [None, doc["_id"]]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "W10=", "WzEsIDJd", "W3siJGd0IjogIiJ9LCAxXQ=="])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, NEWEST_FIRST)
+    assert exc.value.status_code == 400
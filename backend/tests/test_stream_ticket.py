@@ -0,0 +1,18 @@
+from auth.jwt_handler import STREAM_TICKET_PURPOSE, create_access_token, create_stream_ticket, verify_token
+
+CLAIMS = {"sub": "ann@example.com", "user_id": "65a1b2c3d4e5f6789abcdef1", "role": "agent"}
+
+
+def test_stream_ticket_opens_streams_only():
+    payload = verify_token(create_access_token(CLAIMS))
+    ticket = create_stream_ticket(payload)
+    
+    assert verify_token(ticket) is None
+    streamed = verify_token(ticket, purpose=STREAM_TICKET_PURPOSE)
+    assert streamed["user_id"] == CLAIMS["user_id"]
+    assert streamed["session_exp"] == payload["exp"]
+    assert streamed["exp"] < payload["exp"]
+
+
+def test_access_token_is_not_a_stream_ticket():
+    assert verify_token(create_access_token(CLAIMS), purpose=STREAM_TICKET_PURPOSE) is None
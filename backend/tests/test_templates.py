@@ -0,0 +1,12 @@
+from utils.templates import CompiledTemplate, unknown_placeholders
+
+
+def test_unknown_placeholders_lists_what_the_renderer_cannot_fill():
+    assert unknown_placeholders("Hi {lead_name}", "Call {agent_phone} about {foo} on {date}") == ["agent_phone", "foo"]
+    assert unknown_placeholders("Hi {lead_name}", "{agent_name}, {company_name}") == []
+
+
+def test_compiled_template_renders_supported_variables():
+    compiled = CompiledTemplate("Hi {lead_name}", "{agent_name} of {company_name}")
+    values = {"lead_name": "Ann", "agent_name": "Bob", "company_name": "Rich Man Dream"}
+    assert compiled.render(values) == ("Hi Ann", "Bob of Rich Man Dream")
@@ -0,0 +1,257 @@
+"""Live push of CRM changes from a MongoDB change stream.
+
+Each worker process runs one `ChangeFeed`: a single change stream on the
+database, filtered to LIVE_COLLECTIONS, whose events are fanned out to the
+connected subscribers (`GET /api/events/stream`, Server-Sent Events). Events
+are scoped like the REST endpoints: agents only receive documents whose
+`agent_id` (`assigned_agent_id` for leads) is theirs, before or after the
+change. Deletes carry no document, so they are scoped with the pre-image when
+the collection records one (changeStreamPreAndPostImages) and are sent to
+non-agents only otherwise.
+
+Every event id is the change stream resume token. The feed keeps the last
+CHANGE_FEED_REPLAY_SIZE events, so a client reconnecting with Last-Event-ID
+receives what it missed; when the token has left the buffer (or the client
+fell CHANGE_FEED_QUEUE_SIZE events behind) it gets a `resync` event and should
+refetch. The watcher itself resumes from its last token after a stream error.
+
+Pre-images need MongoDB 6.0. An older server rejects the option; the watcher
+then logs a warning and watches without it, so deletes reach non-agents only.
+
+Change streams require a replica set or sharded cluster. On a standalone
+server the watcher logs a warning and retries every CHANGE_FEED_RETRY_SECONDS;
+subscribers still connect and receive heartbeats.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import NamedTuple, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database.connection import database
+from utils.serializers import render_json, serialize_document
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() == "true"
+CHANGE_FEED_REPLAY_SIZE = int(os.getenv("CHANGE_FEED_REPLAY_SIZE", "1000"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "256"))
+CHANGE_FEED_RETRY_SECONDS = float(os.getenv("CHANGE_FEED_RETRY_SECONDS", "5"))
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+
+# Watched collections and the field that scopes their documents to an agent
+LIVE_COLLECTIONS = {
+    "leads": "assigned_agent_id",
+    "calls": "agent_id",
+    "viewings": "agent_id",
+    "sales": "agent_id",
+    "emails": "agent_id"
+}
+LIVE_OPERATIONS = ("insert", "update", "replace", "delete")
+
+# Fields never pushed to clients
+INTERNAL_FIELDS = ("search_tokens",)
+
+# Server errors meaning the stored resume token can no longer be used
+RESUME_TOKEN_LOST_CODES = (260, 280, 286)
+
+# Unknown-field error a server before 6.0 returns for fullDocumentBeforeChange
+UNKNOWN_FIELD_CODE = 40415
+
+
+class ChangeEvent(NamedTuple):
+    """One change, as kept in the replay buffer."""
+    token: str
+    collection: str
+    operation: str
+    document_id: object
+    document: Optional[dict]
+    before: Optional[dict]
+    
+    def _owned_by(self, doc: Optional[dict], user_data: dict) -> bool:
+        return bool(doc) and str(doc.get(LIVE_COLLECTIONS[self.collection])) == user_data.get("user_id")
+    
+    def visible_to(self, user_data: dict) -> bool:
+        """Whether the user may see this change."""
+        if user_data.get("role") != "agent":
+            return True
+        return self._owned_by(self.document, user_data) or self._owned_by(self.before, user_data)
+    
+    def payload(self, user_data: dict) -> dict:
+        """The JSON body sent to this user.
+
+        An agent whose document moved to someone else is told it changed but
+        does not receive its new state.
+        """
+        document = self.document
+        if document and user_data.get("role") == "agent" and not self._owned_by(document, user_data):
+            document = None
+        return {
+            "collection": self.collection,
+            "operation": self.operation,
+            "id": self.document_id,
+            "document": serialize_document(document, INTERNAL_FIELDS) if document else None
+        }
+
+
+class Subscriber:
+    """A connected client: its scope, collection filter and bounded queue."""
+    
+    def __init__(self, user_data: dict, collections: frozenset):
+        self.user_data = user_data
+        self.collections = collections
+        self.queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        self.overflowed = False
+    
+    def wants(self, event: ChangeEvent) -> bool:
+        return event.collection in self.collections and event.visible_to(self.user_data)
+    
+    def offer(self, event: ChangeEvent):
+        """Queue an event without blocking the watcher; a full queue marks the client for resync."""
+        if self.overflowed or not self.wants(event):
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+    
+    def resync(self):
+        """Replace whatever is queued with a resync marker (None): the client refetches instead."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+        self.queue.put_nowait(None)
+
+
+def _change_event(change: dict) -> ChangeEvent:
+    """Build a ChangeEvent from a raw change stream document."""
+    return ChangeEvent(
+        token=change["_id"]["_data"],
+        collection=change["ns"]["coll"],
+        operation=change["operationType"],
+        document_id=change["documentKey"]["_id"],
+        document=change.get("fullDocument"),
+        before=change.get("fullDocumentBeforeChange")
+    )
+
+
+class ChangeFeed:
+    """One change stream watcher per process, fanned out to subscribers."""
+    
+    def __init__(self):
+        self.subscribers = set()
+        self.replay = deque(maxlen=CHANGE_FEED_REPLAY_SIZE)
+        self.resume_token = None
+        # Cleared when the server does not support change stream pre-images
+        self.pre_images = True
+        self._task = None
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def subscribe(self, user_data: dict, collections: frozenset, last_event_id: Optional[str] = None):
+        """Register a subscriber and return it with the buffered events it missed.
+
+        Returns (subscriber, missed); `missed` is None when `last_event_id` is
+        no longer in the replay buffer and the client has to resync. The
+        caller must `unsubscribe` it, so subscribe only where that is
+        guaranteed to run (inside the stream's try/finally).
+        """
+        subscriber = Subscriber(user_data, collections)
+        # No await between registering and reading the buffer, so nothing is lost or repeated
+        self.subscribers.add(subscriber)
+        
+        if not last_event_id:
+            return subscriber, []
+        
+        tokens = [event.token for event in self.replay]
+        if last_event_id not in tokens:
+            return subscriber, None
+        
+        missed = list(self.replay)[tokens.index(last_event_id) + 1:]
+        return subscriber, [event for event in missed if subscriber.wants(event)]
+    
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+    
+    def publish(self, change: dict):
+        """Record a change stream document and fan it out."""
+        event = _change_event(change)
+        self.resume_token = change["_id"]
+        self.replay.append(event)
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+    
+    def _history_lost(self):
+        """The stream restarted without its token: every client has to refetch."""
+        self.resume_token = None
+        self.replay.clear()
+        for subscriber in self.subscribers:
+            subscriber.resync()
+    
+    def _pre_images_unsupported(self, error: OperationFailure) -> bool:
+        return self.pre_images and (
+            error.code == UNKNOWN_FIELD_CODE or "fullDocumentBeforeChange" in str(error)
+        )
+    
+    async def watch(self):
+        """Consume the change stream until it fails."""
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(LIVE_COLLECTIONS)},
+            "operationType": {"$in": list(LIVE_OPERATIONS)}
+        }}]
+        options = {"full_document_before_change": "whenAvailable"} if self.pre_images else {}
+        async with database.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            **options
+        ) as stream:
+            logger.info("Change feed watching " + ", ".join(LIVE_COLLECTIONS))
+            async for change in stream:
+                self.publish(change)
+    
+    async def run_forever(self):
+        """Keep the watcher running, resuming from the last token after errors."""
+        warned = False
+        while True:
+            try:
+                await self.watch()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if self._pre_images_unsupported(e):
+                    logger.warning(f"Change feed watching without pre-images (requires MongoDB 6.0): {e}")
+                    self.pre_images = False
+                    continue
+                if e.code in RESUME_TOKEN_LOST_CODES:
+                    logger.warning(f"Change feed lost its resume point, restarting: {e}")
+                    self._history_lost()
+                    continue
+                if not warned:
+                    logger.warning(f"Change feed unavailable, retrying every {CHANGE_FEED_RETRY_SECONDS}s: {e}")
+                    warned = True
+            except (PyMongoError, NotImplementedError) as e:
+                if not warned:
+                    logger.warning(f"Change feed interrupted, retrying every {CHANGE_FEED_RETRY_SECONDS}s: {e}")
+                    warned = True
+            await asyncio.sleep(CHANGE_FEED_RETRY_SECONDS)
+
+
+def sse_message(event: str, data, event_id: Optional[str] = None) -> bytes:
+    """Format one Server-Sent Events message."""
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", "data: " + render_json(data).decode("utf-8")]
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+change_feed = ChangeFeed()
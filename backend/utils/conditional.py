@@ -0,0 +1,120 @@
+"""Conditional GET (ETag / If-None-Match) backed by per-collection write generations.
+
+Every write handler bumps a counter for the collections it changed in the
+`write_generations` collection. A GET route declares the collections its
+response depends on with `Depends(conditional_get(...))`; the dependency reads
+their counters (one `_id` lookup) and hashes them with the request path and
+query, the caller's role and id, and the current UTC date (dashboard buckets
+move at midnight). If the client's If-None-Match matches, `NotModified` is
+raised and a bodiless 304 is sent before the route queries or serializes
+anything. Otherwise the ETag is attached to the response by `ETagMiddleware`.
+
+Writes made outside the API (e.g. a mongo shell) must call
+`bump_generations` or clients keep their cached copies until the next write.
+"""
+import hashlib
+from datetime import datetime
+
+from fastapi import Depends, Request
+from pymongo import UpdateOne
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+from auth.middleware import get_current_user_data
+from database.connection import write_generations_collection
+
+# Sent with every validated response: always revalidate, per user
+CONDITIONAL_HEADERS = {
+    "Cache-Control": "private, no-cache",
+    "Vary": "Authorization"
+}
+
+
+class NotModified(Exception):
+    """Raised by `conditional_get` when the client's copy is current."""
+    
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+async def bump_generations(*collections: str):
+    """Record that these collections changed."""
+    await write_generations_collection.bulk_write([
+        UpdateOne({"_id": name}, {"$inc": {"generation": 1}}, upsert=True)
+        for name in collections
+    ], ordered=False)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def etag_for(request: Request, user_data: dict, generations: dict) -> str:
+    """The ETag of this request's response when built from data at `generations`."""
+    validator = "|".join([
+        request.url.path,
+        "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items())),
+        str(user_data.get("role")),
+        str(user_data.get("user_id")),
+        datetime.utcnow().strftime("%Y-%m-%d"),
+        *(f"{name}:{generation}" for name, generation in generations.items())
+    ])
+    return f'W/"{hashlib.blake2b(validator.encode(), digest_size=12).hexdigest()}"'
+
+
+def conditional_get(*collections: str):
+    """Dependency answering 304 when none of `collections` changed since the client's copy."""
+    
+    async def validate(request: Request, user_data: dict = Depends(get_current_user_data)) -> str:
+        stored = {
+            doc["_id"]: doc.get("generation", 0)
+            async for doc in write_generations_collection.find({"_id": {"$in": list(collections)}})
+        }
+        generations = {name: stored.get(name, 0) for name in collections}
+        etag = etag_for(request, user_data, generations)
+        
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            raise NotModified(etag)
+        
+        # Routes serving cached bodies relabel them with the generations they were built at
+        request.state.generations = generations
+        request.state.etag = etag
+        return etag
+    
+    return validate
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    """Exception handler turning NotModified into a bodiless 304."""
+    return Response(status_code=304, headers={"ETag": exc.etag, **CONDITIONAL_HEADERS})
+
+
+class ETagMiddleware:
+    """Adds the ETag computed by `conditional_get` to successful responses."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                etag = scope.get("state", {}).get("etag")
+                if etag:
+                    headers = MutableHeaders(scope=message)
+                    headers["ETag"] = etag
+                    for name, value in CONDITIONAL_HEADERS.items():
+                        headers[name] = value
+            await send(message)
+        
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,176 @@
+"""Materialized per-agent daily rollup of the dashboard metrics.
+
+Every lead, viewing and sale contributes counters to one `daily_metrics` row
+keyed by (agent_id, day). Write handlers call the `track_*_change` helpers with
+the document before and after the write, so the rollup is maintained with a
+single `$inc` per affected row; `rebuild_daily_metrics` recomputes it from the
+raw collections. Documents without a timestamp are counted in an undated row
+(day=None): they add to the totals but to no daily series.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+import logging
+
+from pymongo import UpdateOne
+
+from database.connection import (
+    daily_metrics_collection,
+    leads_collection,
+    viewings_collection,
+    sales_collection
+)
+from models.money import amount_to_cents
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = [
+    "leads_created",
+    "leads_hot",
+    "leads_warm",
+    "leads_cold",
+    "viewings_scheduled",
+    "viewings_completed",
+    "viewings_cancelled",
+    "sales_active",
+    "sales_closed",
+    "revenue_closed"
+]
+
+
+def _day(value) -> Optional[datetime]:
+    """Truncate a timestamp to midnight; anything else belongs to the undated row."""
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def sale_revenue(sale: dict) -> float:
+    """Revenue of a sale in currency units, preferring the stored numeric field."""
+    cents = sale.get("value_cents")
+    if cents is None:
+        cents = amount_to_cents(sale.get("value"))
+    return (cents or 0) / 100
+
+
+def lead_metrics(lead: dict) -> list:
+    """Rollup contributions of a lead: counted on its creation day by status."""
+    if not lead:
+        return []
+    fields = {"leads_created": 1}
+    if lead.get("status") in ("hot", "warm", "cold"):
+        fields[f"leads_{lead['status']}"] = 1
+    return [(lead.get("assigned_agent_id"), _day(lead.get("created_at")), fields)]
+
+
+def viewing_metrics(viewing: dict) -> list:
+    """Rollup contributions of a viewing: counted on its creation day by status."""
+    if not viewing or viewing.get("status") not in ("scheduled", "completed", "cancelled"):
+        return []
+    return [(viewing.get("agent_id"), _day(viewing.get("created_at")), {f"viewings_{viewing['status']}": 1})]
+
+
+def sale_metrics(sale: dict) -> list:
+    """Rollup contributions of a sale: active on its creation day, closed on its last activity day."""
+    if not sale:
+        return []
+    if sale.get("stage") == "closed":
+        fields = {"sales_closed": 1, "revenue_closed": sale_revenue(sale)}
+        return [(sale.get("agent_id"), _day(sale.get("last_activity")), fields)]
+    return [(sale.get("agent_id"), _day(sale.get("created_at")), {"sales_active": 1})]
+
+
+def _diff(metrics_fn, before: dict, after: dict) -> dict:
+    """Net counter changes per (agent_id, day) between two versions of a document."""
+    changes = defaultdict(lambda: defaultdict(int))
+    for sign, doc in ((-1, before), (1, after)):
+        for agent_id, day, fields in metrics_fn(doc):
+            for field, amount in fields.items():
+                changes[(agent_id, day)][field] += sign * amount
+    return {
+        key: {field: amount for field, amount in fields.items() if amount}
+        for key, fields in changes.items()
+    }
+
+
+async def _apply(metrics_fn, before: dict, after: dict):
+    """Apply the rollup delta of a write; failures are logged and fixed by a rebuild."""
+    await _apply_changes(_diff(metrics_fn, before, after))
+
+
+async def _apply_changes(changes: dict):
+    """Write net counter changes keyed by (agent_id, day) as one bulk $inc."""
+    operations = [
+        UpdateOne({"agent_id": agent_id, "day": day}, {"$inc": fields}, upsert=True)
+        for (agent_id, day), fields in changes.items()
+        if fields
+    ]
+    if not operations:
+        return
+    try:
+        await daily_metrics_collection.bulk_write(operations, ordered=False)
+    except Exception:
+        logger.exception("Failed to update daily metrics rollup")
+
+
+async def track_lead_change(before: dict, after: dict):
+    """Update the rollup for a created (before=None), updated or deleted (after=None) lead."""
+    await _apply(lead_metrics, before, after)
+
+
+async def track_leads_created(leads: list):
+    """Update the rollup for a batch of inserted leads with a single bulk write."""
+    changes = defaultdict(lambda: defaultdict(int))
+    for lead in leads:
+        for agent_id, day, fields in lead_metrics(lead):
+            for field, amount in fields.items():
+                changes[(agent_id, day)][field] += amount
+    await _apply_changes(changes)
+
+
+async def track_viewing_change(before: dict, after: dict):
+    """Update the rollup for a created, updated or deleted viewing."""
+    await _apply(viewing_metrics, before, after)
+
+
+async def track_sale_change(before: dict, after: dict):
+    """Update the rollup for a created, updated or deleted sale."""
+    await _apply(sale_metrics, before, after)
+
+
+async def rebuild_daily_metrics() -> int:
+    """Recompute the whole rollup from the raw collections. Returns the number of rows written."""
+    rows = defaultdict(lambda: defaultdict(int))
+    sources = [
+        (leads_collection, lead_metrics, {"assigned_agent_id": 1, "status": 1, "created_at": 1}),
+        (viewings_collection, viewing_metrics, {"agent_id": 1, "status": 1, "created_at": 1}),
+        (sales_collection, sale_metrics, {"agent_id": 1, "stage": 1, "value": 1, "value_cents": 1, "created_at": 1, "last_activity": 1})
+    ]
+    
+    for collection, metrics_fn, projection in sources:
+        async for doc in collection.find({}, projection):
+            for agent_id, day, fields in metrics_fn(doc):
+                for field, amount in fields.items():
+                    rows[(agent_id, day)][field] += amount
+    
+    documents = [
+        {"agent_id": agent_id, "day": day, **fields}
+        for (agent_id, day), fields in rows.items()
+    ]
+    
+    await daily_metrics_collection.delete_many({})
+    if documents:
+        await daily_metrics_collection.insert_many(documents, ordered=False)
+    
+    logger.info(f"Rebuilt daily metrics rollup with {len(documents)} rows")
+    return len(documents)
+
+
+async def ensure_daily_metrics() -> int:
+    """Build the rollup if it is empty, e.g. on the first start against an existing database.
+
+    Returns the number of rows written (0 when the rollup already existed).
+    """
+    if await daily_metrics_collection.find_one({}, {"_id": 1}):
+        return 0
+    return await rebuild_daily_metrics()
@@ -0,0 +1,238 @@
+"""Short-lived cache of dashboard responses with write-driven invalidation.
+
+Responses are cached per endpoint and data scope: agents see only their own
+rollup rows, so each agent has its own entry (`agent:<user_id>`), while every
+other role sees the same global figures and shares one entry (`all`).
+Concurrent requests for the same entry share one computation. Write handlers
+call `invalidate_dashboards` with the documents they touched, which drops the
+global entries and those of the agents involved; DASHBOARD_CACHE_TTL_SECONDS
+bounds staleness for anything that slips past invalidation.
+
+Entries live in process memory by default. Set DASHBOARD_CACHE_URL to a
+`redis://` URL (requires the `redis` package) to share the cache, and its
+invalidations, between workers.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request
+
+from utils.conditional import etag_for
+from utils.serializers import render_json
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # pragma: no cover - redis is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_CACHE_URL = os.getenv("DASHBOARD_CACHE_URL")
+# Invalidation versions kept by the in-memory backend
+DASHBOARD_CACHE_MAX_VERSIONS = int(os.getenv("DASHBOARD_CACHE_MAX_VERSIONS", "4096"))
+
+DASHBOARD_ENDPOINTS = ("stats", "charts")
+
+
+class MemoryCacheBackend:
+    """Per-process cache entries with expiry and invalidation versions.
+
+    Versions come from one process-wide counter and are kept for at most
+    max_versions keys. A key whose version was evicted reads the highest
+    evicted version, so it never reads a version it had before.
+    """
+    
+    def __init__(self, max_versions: int = DASHBOARD_CACHE_MAX_VERSIONS):
+        self.max_versions = max_versions
+        self._entries = {}
+        self._versions = OrderedDict()
+        self._counter = 0
+        self._evicted = 0
+    
+    def _version(self, key: str) -> int:
+        return self._versions.get(key, self._evicted)
+    
+    async def get(self, key: str) -> tuple:
+        """Return (value, version): the live entry, if any, and the key's current version."""
+        version = self._version(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, version
+        expires_at, entry_version, value = entry
+        if expires_at <= time.monotonic() or entry_version != version:
+            self._entries.pop(key, None)
+            return None, version
+        return value, version
+    
+    async def set(self, key: str, value, version: int, ttl: float):
+        # Invalidated since `version` was read: the value may predate the write
+        if self._version(key) == version:
+            self._entries[key] = (time.monotonic() + ttl, version, value)
+    
+    async def bump(self, keys: list):
+        for key in keys:
+            self._counter += 1
+            self._versions[key] = self._counter
+            self._versions.move_to_end(key)
+            self._entries.pop(key, None)
+        while len(self._versions) > self.max_versions:
+            _, version = self._versions.popitem(last=False)
+            self._evicted = max(self._evicted, version)
+
+
+class RedisCacheBackend:
+    """Cache entries and invalidation versions shared between workers through Redis.
+
+    Entries are stored as JSON together with the version they were computed
+    at; a version bumped by any worker (INCR) turns them into misses.
+    """
+    
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError("DASHBOARD_CACHE_URL is set but the redis package is not installed")
+        self._client = redis.from_url(url)
+    
+    @staticmethod
+    def _version_key(key: str) -> str:
+        return f"{key}:version"
+    
+    async def get(self, key: str) -> tuple:
+        """Return (value, version): the entry, if computed at the current version, and that version."""
+        entry, version = await self._client.mget(key, self._version_key(key))
+        version = int(version or 0)
+        if entry is None:
+            return None, version
+        entry = json.loads(entry)
+        if entry["version"] != version:
+            return None, version
+        return entry["value"], version
+    
+    async def set(self, key: str, value, version: int, ttl: float):
+        await self._client.set(key, render_json({"version": version, "value": value}), px=int(ttl * 1000))
+    
+    async def bump(self, keys: list):
+        if keys:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.incr(self._version_key(key))
+                pipe.delete(*keys)
+                await pipe.execute()
+
+
+class ResponseCache:
+    """TTL cache with request coalescing; backend errors fall back to computing.
+
+    Every entry carries the invalidation version of its key at the time its
+    computation started, and only an entry of the current version is served.
+    A computation that an invalidation overtook, in this worker or another,
+    is therefore never served from the cache.
+    """
+    
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        # key -> (version, task) of the computation running in this process
+        self._inflight = {}
+    
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable], version: Optional[int]):
+        value = await compute()
+        if version is None:
+            # The backend could not be read; don't store what cannot be versioned
+            return value
+        try:
+            await self.backend.set(key, value, version, self.ttl)
+        except Exception:
+            logger.exception("Failed to store dashboard cache entry")
+        return value
+    
+    def _forget(self, key: str, task: asyncio.Future):
+        # An invalidation may already have replaced the in-flight task
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[1] is task:
+            del self._inflight[key]
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable]):
+        """Return the cached value, or compute it once for all concurrent callers."""
+        try:
+            value, version = await self.backend.get(key)
+        except Exception:
+            logger.exception("Failed to read dashboard cache entry")
+            value, version = None, None
+        if value is not None:
+            return value
+        
+        # Join a running computation only if it started at the current version
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight[0] == version:
+            task = inflight[1]
+        else:
+            task = asyncio.ensure_future(self._compute_and_store(key, compute, version))
+            self._inflight[key] = (version, task)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        
+        # A disconnecting client must not cancel the computation others are waiting on
+        return await asyncio.shield(task)
+    
+    async def delete(self, keys: list):
+        # Later requests must not join a computation started before the write
+        for key in keys:
+            self._inflight.pop(key, None)
+        try:
+            await self.backend.bump(keys)
+        except Exception:
+            logger.exception("Failed to invalidate dashboard cache entries")
+
+
+dashboard_cache = ResponseCache(
+    RedisCacheBackend(DASHBOARD_CACHE_URL) if DASHBOARD_CACHE_URL else MemoryCacheBackend(),
+    DASHBOARD_CACHE_TTL_SECONDS
+)
+
+
+def _scope(user_data: dict) -> str:
+    if user_data.get("role") == "agent":
+        return f"agent:{user_data.get('user_id')}"
+    return "all"
+
+
+def dashboard_cache_key(endpoint: str, user_data: dict) -> str:
+    """Cache key of a dashboard endpoint for the user's data scope."""
+    return f"dashboard:{_scope(user_data)}:{endpoint}"
+
+
+async def cached_dashboard(endpoint: str, request: Request, user_data: dict, compute: Callable[[], Awaitable]):
+    """Serve a dashboard response from cache, computing it on a miss.
+
+    Entries keep the write generations `conditional_get` read before they
+    were computed. A body cached before later writes is sent with the ETag of
+    those older generations, so a client never stores it under a newer ETag
+    and keeps revalidating until the entry is recomputed.
+    """
+    generations = getattr(request.state, "generations", {})
+    
+    async def compute_entry():
+        return {"generations": generations, "body": await compute()}
+    
+    entry = await dashboard_cache.get_or_compute(dashboard_cache_key(endpoint, user_data), compute_entry)
+    if entry["generations"] != generations:
+        request.state.etag = etag_for(request, user_data, entry["generations"])
+    return entry["body"]
+
+
+async def invalidate_dashboards(*docs: Optional[dict]):
+    """Drop cached dashboards affected by writes to these documents."""
+    scopes = {"all"}
+    for doc in docs:
+        if doc:
+            agent_id = doc.get("agent_id") or doc.get("assigned_agent_id")
+            if agent_id:
+                scopes.add(f"agent:{agent_id}")
+    await dashboard_cache.delete([
+        f"dashboard:{scope}:{endpoint}" for scope in scopes for endpoint in DASHBOARD_ENDPOINTS
+    ])
@@ -0,0 +1,208 @@
+"""Durable email campaigns: one template rendered for every matching lead.
+
+The API stores a campaign as `queued` together with its lead filter and
+sender; the email worker pool runs it. Like outbox jobs, campaigns are
+claimed with a lease (`lease_until`). The worker walks the matching leads in
+`_id` order and, after each batch, records the batch's last lead id
+(`last_lead_id`) together with the progress counters. A campaign whose worker
+died is claimed again once its lease lapses and resumes after the last
+recorded batch. Re-running that batch is harmless: emails are unique per
+(campaign_id, lead_id) and outbox jobs per email_id. A campaign that raises
+is marked failed.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from database.connection import email_campaigns_collection, email_templates_collection, emails_collection, leads_collection
+from database.indexes import DUPLICATE_KEY_ERROR
+from utils.conditional import bump_generations
+from utils.email_queue import enqueue_emails
+from utils.query import leads_query
+from utils.templates import compiled_template, template_values
+
+logger = logging.getLogger(__name__)
+
+# Campaign emails are rendered, inserted and queued in batches of this size
+CAMPAIGN_BATCH_SIZE = int(os.getenv("EMAIL_CAMPAIGN_BATCH_SIZE", "500"))
+CAMPAIGN_LEASE_SECONDS = float(os.getenv("EMAIL_CAMPAIGN_LEASE_SECONDS", "300"))
+
+# Token fields kept on the campaign to scope the leads and fill the template
+SENDER_FIELDS = ("user_id", "role", "name", "email")
+
+# Set when a campaign is created in this process so an idle runner skips its poll wait
+campaigns_available = asyncio.Event()
+
+
+class CampaignLeaseLost(Exception):
+    """Another worker claimed the campaign after this one's lease lapsed."""
+
+
+def campaign_sender(user_data: dict) -> dict:
+    """The parts of the creator's token a worker needs to run the campaign."""
+    return {field: user_data[field] for field in SENDER_FIELDS if user_data.get(field) is not None}
+
+
+async def claim_campaign(worker_id: str) -> Optional[dict]:
+    """Lease the next queued or interrupted campaign, or return None."""
+    now = datetime.utcnow()
+    return await email_campaigns_collection.find_one_and_update(
+        {"status": {"$in": ["queued", "running"]}, "lease_until": {"$lte": now}},
+        {"$set": {
+            "status": "running",
+            "lease_until": now + timedelta(seconds=CAMPAIGN_LEASE_SECONDS),
+            "locked_by": worker_id,
+            "updated_at": now
+        }},
+        sort=[("lease_until", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _insert_campaign_emails(emails: list) -> list:
+    """Insert a batch of campaign emails and return the stored ones.
+
+    Emails already stored by an interrupted run of the same batch are
+    skipped on insert and read back instead.
+    """
+    try:
+        await emails_collection.insert_many(emails, ordered=False)
+        return emails
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        existing = {error["index"] for error in errors}
+    
+    inserted = [email for index, email in enumerate(emails) if index not in existing]
+    stored = await emails_collection.find({
+        "campaign_id": emails[0]["campaign_id"],
+        "lead_id": {"$in": [email["lead_id"] for index, email in enumerate(emails) if index in existing]}
+    }).to_list(length=None)
+    return inserted + stored
+
+
+async def _queue_campaign_batch(campaign: dict, worker_id: str, emails: list, skipped: int, last_lead_id: ObjectId):
+    """Insert and queue one batch of campaign emails, then record progress and renew the lease."""
+    if emails:
+        await enqueue_emails(await _insert_campaign_emails(emails))
+        await bump_generations("emails")
+    
+    now = datetime.utcnow()
+    result = await email_campaigns_collection.update_one(
+        {"_id": campaign["_id"], "locked_by": worker_id},
+        {
+            "$inc": {"processed": len(emails) + skipped, "queued": len(emails), "skipped": skipped},
+            "$set": {
+                "last_lead_id": last_lead_id,
+                "lease_until": now + timedelta(seconds=CAMPAIGN_LEASE_SECONDS),
+                "updated_at": now
+            }
+        }
+    )
+    if not result.matched_count:
+        raise CampaignLeaseLost(campaign["_id"])
+
+
+async def _finish(campaign: dict, worker_id: str, status: str, error: Optional[str] = None):
+    now = datetime.utcnow()
+    await email_campaigns_collection.update_one(
+        {"_id": campaign["_id"], "locked_by": worker_id},
+        {
+            "$set": {"status": status, "error": error, "finished_at": now, "updated_at": now},
+            "$unset": {"lease_until": "", "locked_by": ""}
+        }
+    )
+
+
+async def run_campaign(campaign: dict, worker_id: str):
+    """Render and queue the campaign's emails from where its last run stopped."""
+    template = await email_templates_collection.find_one({"_id": campaign["template_id"]})
+    if not template:
+        await _finish(campaign, worker_id, "failed", "Template not found")
+        return
+    
+    sender = campaign["sender"]
+    filters = campaign.get("filter", {})
+    query = leads_query(
+        filters.get("search"), filters.get("status"),
+        filters.get("min_budget"), filters.get("max_budget"), sender
+    )
+    if campaign.get("last_lead_id"):
+        query = {"$and": [query, {"_id": {"$gt": campaign["last_lead_id"]}}]}
+    
+    emails, skipped, last_lead_id = [], 0, None
+    compiled = compiled_template(template)
+    rendered_at = datetime.now()
+    try:
+        leads = leads_collection.find(query, {"search_tokens": 0}).sort("_id", 1).batch_size(CAMPAIGN_BATCH_SIZE)
+        async for lead in leads:
+            last_lead_id = lead["_id"]
+            
+            # Leads without an address cannot be emailed
+            if not lead.get("email"):
+                skipped += 1
+            else:
+                now = datetime.utcnow()
+                subject, content = compiled.render(template_values(lead, sender, rendered_at))
+                emails.append({
+                    "lead_id": lead["_id"],
+                    "lead_name": lead.get("name"),
+                    "to_email": lead["email"],
+                    "from_email": sender.get("email", "noreply@richmansdream.com"),
+                    "subject": subject,
+                    "content": content,
+                    "email_type": "template",
+                    "template_id": str(template["_id"]),
+                    "campaign_id": campaign["_id"],
+                    "status": "sent",
+                    "direction": "outbound",
+                    "agent_id": ObjectId(sender.get("user_id")),
+                    "agent_name": sender.get("name"),
+                    "created_at": now,
+                    "updated_at": now,
+                    "sent_at": now
+                })
+            
+            if len(emails) + skipped >= CAMPAIGN_BATCH_SIZE:
+                await _queue_campaign_batch(campaign, worker_id, emails, skipped, last_lead_id)
+                emails, skipped = [], 0
+                rendered_at = datetime.now()
+        
+        if last_lead_id is not None and (emails or skipped):
+            await _queue_campaign_batch(campaign, worker_id, emails, skipped, last_lead_id)
+    except CampaignLeaseLost:
+        logger.warning(f"Email campaign {campaign['_id']} was taken over by another worker")
+        return
+    except Exception as e:
+        logger.exception(f"Email campaign {campaign['_id']} failed")
+        await _finish(campaign, worker_id, "failed", str(e))
+        return
+    
+    await _finish(campaign, worker_id, "completed")
+
+
+async def run_campaigns_forever(worker_id: str, poll_interval: float):
+    """Claim and run campaigns one at a time until cancelled."""
+    while True:
+        try:
+            campaign = await claim_campaign(worker_id)
+        except Exception:
+            logger.exception("Failed to claim an email campaign")
+            campaign = None
+        
+        if campaign is None:
+            try:
+                await asyncio.wait_for(campaigns_available.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            campaigns_available.clear()
+            continue
+        
+        await run_campaign(campaign, worker_id)
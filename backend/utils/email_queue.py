@@ -0,0 +1,246 @@
+"""Durable outbound email queue backed by the `email_outbox` collection.
+
+Sending an email inserts an outbox job next to the `emails` document. Workers
+claim jobs with a lease: claiming pushes the job's `available_at` forward by
+EMAIL_LEASE_SECONDS, so a job whose worker dies simply becomes claimable again.
+Failures are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS, after
+which the job and the email are marked failed. Delivered jobs are kept for
+EMAIL_OUTBOX_RETENTION_DAYS (TTL index) for troubleshooting.
+
+Delivery is at-least-once. If a lease expires while a send is still in flight
+(a transport slower than EMAIL_LEASE_SECONDS, or a worker stalled between
+sending and recording the outcome), another worker claims the job and the
+email can go out twice. Outcomes are written only for the latest claim (the
+`attempts` filter), so a late worker cannot overwrite the retaken job. Keep the
+lease well above the transport's timeout.
+
+The pool runs inside the API process by default (EMAIL_WORKERS_IN_APP); set it
+to false and run `python manage.py email-worker` to send from a dedicated
+process instead.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from database.connection import email_outbox_collection, emails_collection
+from database.indexes import DUPLICATE_KEY_ERROR
+from utils.conditional import bump_generations
+from utils.email_transport import EmailTransport, PermanentEmailError, get_transport
+
+logger = logging.getLogger(__name__)
+
+EMAIL_WORKER_CONCURRENCY = int(os.getenv("EMAIL_WORKER_CONCURRENCY", "8"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+EMAIL_LEASE_SECONDS = float(os.getenv("EMAIL_LEASE_SECONDS", "120"))
+EMAIL_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_POLL_INTERVAL_SECONDS", "2"))
+EMAIL_WORKERS_IN_APP = os.getenv("EMAIL_WORKERS_IN_APP", "true").lower() == "true"
+
+# Message fields copied into the job, with the alias spellings stored by the API
+MESSAGE_FIELDS = {
+    "to_email": ("to_email", "toEmail"),
+    "from_email": ("from_email", "fromEmail"),
+    "subject": ("subject",),
+    "content": ("content",)
+}
+
+# Set when jobs are enqueued in this process so idle workers skip their poll wait
+_jobs_available = asyncio.Event()
+
+
+def _message(email: dict) -> dict:
+    return {
+        field: next((email[key] for key in keys if email.get(key) is not None), None)
+        for field, keys in MESSAGE_FIELDS.items()
+    }
+
+
+def _outbox_job(email: dict, now: datetime) -> dict:
+    return {
+        "email_id": email["_id"],
+        "message": _message(email),
+        "status": "queued",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+async def enqueue_emails(emails: list) -> int:
+    """Queue already-inserted email documents for delivery. Returns the number queued.
+    
+    Emails that already have a job (outbox jobs are unique per email) are skipped.
+    """
+    if not emails:
+        return 0
+    now = datetime.utcnow()
+    duplicates = 0
+    try:
+        await email_outbox_collection.insert_many([_outbox_job(email, now) for email in emails], ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        duplicates = len(errors)
+    _jobs_available.set()
+    return len(emails) - duplicates
+
+
+async def enqueue_email(email: dict):
+    """Queue one already-inserted email document for delivery."""
+    await enqueue_emails([email])
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with +/-10% jitter, capped at EMAIL_RETRY_MAX_SECONDS."""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.9, 1.1)
+
+
+async def claim_job(worker_id: str) -> Optional[dict]:
+    """Lease the next due job, or return None when the queue is idle."""
+    now = datetime.utcnow()
+    return await email_outbox_collection.find_one_and_update(
+        {"status": "queued", "available_at": {"$lte": now}},
+        {
+            "$set": {
+                "available_at": now + timedelta(seconds=EMAIL_LEASE_SECONDS),
+                "locked_by": worker_id,
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _complete(job: dict):
+    """Mark a job and its email delivered."""
+    now = datetime.utcnow()
+    await asyncio.gather(
+        email_outbox_collection.update_one(
+            {"_id": job["_id"], "attempts": job["attempts"]},
+            {"$set": {"status": "sent", "completed_at": now, "updated_at": now}, "$unset": {"locked_by": ""}}
+        ),
+        emails_collection.update_one(
+            {"_id": job["email_id"]},
+            {"$set": {"status": "delivered", "updated_at": now}}
+        ),
+        bump_generations("emails")
+    )
+
+
+async def _fail(job: dict, error: Exception):
+    """Reschedule a failed job with backoff, or give up after the last attempt."""
+    now = datetime.utcnow()
+    permanent = isinstance(error, PermanentEmailError)
+    
+    if permanent or job["attempts"] >= EMAIL_MAX_ATTEMPTS:
+        await asyncio.gather(
+            email_outbox_collection.update_one(
+                {"_id": job["_id"], "attempts": job["attempts"]},
+                {
+                    "$set": {"status": "failed", "last_error": str(error), "completed_at": now, "updated_at": now},
+                    "$unset": {"locked_by": ""}
+                }
+            ),
+            emails_collection.update_one(
+                {"_id": job["email_id"]},
+                {"$set": {"status": "failed", "updated_at": now}}
+            ),
+            bump_generations("emails")
+        )
+        logger.warning(f"Email {job['email_id']} failed after {job['attempts']} attempt(s): {error}")
+        return
+    
+    await email_outbox_collection.update_one(
+        {"_id": job["_id"], "attempts": job["attempts"]},
+        {
+            "$set": {
+                "available_at": now + timedelta(seconds=retry_delay(job["attempts"])),
+                "last_error": str(error),
+                "updated_at": now
+            },
+            "$unset": {"locked_by": ""}
+        }
+    )
+
+
+async def process_job(job: dict, transport: EmailTransport):
+    """Deliver one claimed job and record the outcome."""
+    try:
+        await transport.send(job["message"])
+    except Exception as exc:
+        await _fail(job, exc)
+    else:
+        await _complete(job)
+
+
+class EmailWorkerPool:
+    """A fixed number of asyncio workers draining the outbox."""
+    
+    def __init__(self, concurrency: int = EMAIL_WORKER_CONCURRENCY, transport: EmailTransport = None):
+        self.concurrency = concurrency
+        self.transport = transport or get_transport()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+    
+    async def _wait_for_jobs(self):
+        try:
+            await asyncio.wait_for(_jobs_available.wait(), timeout=EMAIL_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _jobs_available.clear()
+    
+    async def _work(self):
+        while True:
+            try:
+                job = await claim_job(self.worker_id)
+            except Exception:
+                logger.exception("Failed to claim an email job")
+                job = None
+            
+            if job is None:
+                await self._wait_for_jobs()
+                continue
+            
+            try:
+                await process_job(job, self.transport)
+            except Exception:
+                # The lease expires and the job is retried
+                logger.exception(f"Failed to record the outcome of email job {job['_id']}")
+    
+    def start(self):
+        """Start the workers, and one email campaign runner, on the running event loop."""
+        # Imported here: campaigns queue their emails through this module
+        from utils.email_campaigns import run_campaigns_forever
+        
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+            self._tasks.append(asyncio.create_task(run_campaigns_forever(self.worker_id, EMAIL_POLL_INTERVAL_SECONDS)))
+            logger.info(f"Started {self.concurrency} email workers ({type(self.transport).__name__})")
+    
+    async def stop(self):
+        """Cancel the workers; jobs in flight are released when their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def run_forever(self):
+        """Run the workers until cancelled."""
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
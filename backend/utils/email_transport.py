@@ -0,0 +1,102 @@
+"""Pluggable delivery backends for the outbound email queue.
+
+A transport takes one queued message (`to_email`, `from_email`, `subject`,
+`content`) and delivers it, raising on failure. Transient errors are retried
+by the queue; raise `PermanentEmailError` for messages that can never succeed.
+
+EMAIL_TRANSPORT selects the backend: `log` (default, records the send only),
+`smtp`, `memory` (keeps messages in process, for tests), or a dotted
+`module:Class` path to any class with an async `send(message)`.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentEmailError(Exception):
+    """A delivery failure that retrying cannot fix (e.g. rejected recipient)."""
+
+
+class EmailTransport:
+    """Base class for transports."""
+    
+    async def send(self, message: dict):
+        raise NotImplementedError
+
+
+class LogTransport(EmailTransport):
+    """Simulated delivery: logs the message and reports success."""
+    
+    async def send(self, message: dict):
+        logger.info(f"Email to {message.get('to_email')} delivered (log transport): {message.get('subject')}")
+
+
+class MemoryTransport(EmailTransport):
+    """Keeps delivered messages in memory; a local stand-in for tests."""
+    
+    def __init__(self):
+        self.sent = []
+    
+    async def send(self, message: dict):
+        self.sent.append(message)
+
+
+class SMTPTransport(EmailTransport):
+    """Delivers through an SMTP server, one connection per send, off the event loop.
+    
+    Configured with SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD,
+    SMTP_STARTTLS and SMTP_TIMEOUT_SECONDS. Point it at a local debugging
+    server (e.g. `python -m aiosmtpd -n -l localhost:1025`) in development.
+    """
+    
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "localhost")
+        self.port = int(os.getenv("SMTP_PORT", "25"))
+        self.username = os.getenv("SMTP_USERNAME")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.starttls = os.getenv("SMTP_STARTTLS", "").lower() == "true"
+        self.timeout = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+    
+    def _send_sync(self, message: dict):
+        email = EmailMessage()
+        email["From"] = message.get("from_email")
+        email["To"] = message.get("to_email")
+        email["Subject"] = message.get("subject", "")
+        email.set_content(message.get("content", ""))
+        
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password or "")
+                smtp.send_message(email)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as exc:
+            raise PermanentEmailError(str(exc)) from exc
+    
+    async def send(self, message: dict):
+        await asyncio.to_thread(self._send_sync, message)
+
+
+TRANSPORTS = {
+    "log": LogTransport,
+    "memory": MemoryTransport,
+    "smtp": SMTPTransport
+}
+
+
+def get_transport(name: str = None) -> EmailTransport:
+    """Instantiate the configured transport."""
+    name = name or os.getenv("EMAIL_TRANSPORT", "log")
+    if name in TRANSPORTS:
+        return TRANSPORTS[name]()
+    
+    module_name, _, class_name = name.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown email transport: {name}")
+    return getattr(importlib.import_module(module_name), class_name)()
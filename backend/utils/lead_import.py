@@ -0,0 +1,325 @@
+"""Streaming bulk import of leads from CSV or NDJSON uploads.
+
+The request body is decoded and parsed incrementally, each row is validated
+with `LeadCreate`, and valid rows are inserted in batches with
+`insert_many(ordered=False)`. Duplicate emails are rejected by the unique
+index on `leads.email` rather than looked up beforehand, and are reported per
+row along with validation errors. While that index is missing (it cannot be
+built over existing duplicates), each batch is checked against stored emails
+instead.
+"""
+import codecs
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Literal, Optional
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from database.connection import leads_collection, users_collection
+from database.indexes import DUPLICATE_KEY_ERROR, LEAD_EMAIL_INDEX
+from models.lead import LeadCreate
+from utils.daily_metrics import track_leads_created
+from utils.conditional import bump_generations
+from utils.dashboard_cache import invalidate_dashboards
+from utils.search import lead_search_tokens
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["csv", "ndjson"]
+
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson"
+}
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# A quoted CSV field may span lines; a record longer than this (typically an
+# unterminated quote) is reported as invalid instead of buffering the upload
+CSV_MAX_RECORD_LINES = 100
+CSV_MAX_RECORD_BYTES = 64 * 1024
+
+# Accept both field names and aliases in uploads; LeadCreate validates by alias
+LEAD_IMPORT_KEYS = {}
+for _name, _field in LeadCreate.model_fields.items():
+    LEAD_IMPORT_KEYS[_name] = _field.alias or _name
+    LEAD_IMPORT_KEYS[_field.alias or _name] = _field.alias or _name
+
+
+async def find_default_agent(user_data: dict) -> Optional[dict]:
+    """The agent new leads fall back to when an admin creates them."""
+    if user_data.get("role") == "agent":
+        return None
+    return await users_collection.find_one({"role": "agent"}, {"name": 1})
+
+
+def build_lead_document(lead_data: LeadCreate, user_data: dict, default_agent: Optional[dict]) -> dict:
+    """Turn a validated lead into the document stored in `leads`."""
+    lead_dict = lead_data.dict(by_alias=True)
+    lead_dict["created_at"] = datetime.utcnow()
+    lead_dict["updated_at"] = datetime.utcnow()
+    
+    # If no assigned agent specified, assign to current user if they're an agent,
+    # otherwise to the default agent
+    if not lead_dict.get("assigned_agent_id"):
+        if user_data.get("role") == "agent":
+            lead_dict["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
+            lead_dict["assigned_agent"] = user_data.get("name")
+        elif default_agent:
+            lead_dict["assigned_agent_id"] = default_agent["_id"]
+            lead_dict["assigned_agent"] = default_agent["name"]
+    
+    # Convert assigned_agent_id to ObjectId if it's a string
+    if lead_dict.get("assigned_agent_id") and isinstance(lead_dict["assigned_agent_id"], str):
+        lead_dict["assigned_agent_id"] = ObjectId(lead_dict["assigned_agent_id"])
+    
+    # Build search index tokens
+    lead_dict["search_tokens"] = lead_search_tokens(lead_dict)
+    return lead_dict
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines without buffering the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+class _BufferedLines:
+    """Iterator over buffered lines that records whether the reader ran past them."""
+    
+    def __init__(self, lines: list):
+        self._lines = iter(lines)
+        self.exhausted = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> str:
+        try:
+            return next(self._lines)
+        except StopIteration:
+            self.exhausted = True
+            raise
+
+
+async def _csv_rows(lines: AsyncIterator[str]):
+    """Yield (line, row, error) from CSV lines; the first record is the header.
+    
+    Records are split by `csv.reader` itself, so quoted fields may span lines
+    and stray quotes inside unquoted fields stay literal. A record is complete
+    once the reader returns it without asking for another line. A record still
+    open after CSV_MAX_RECORD_LINES lines or CSV_MAX_RECORD_BYTES is reported
+    as invalid and parsing resumes on the next line.
+    """
+    header = None
+    pending = []
+    pending_bytes = 0
+    line_number = start = 0
+    
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            start = line_number
+        pending.append(line + "\n")
+        pending_bytes += len(line.encode("utf-8")) + 1
+        
+        source = _BufferedLines(pending)
+        values = next(csv.reader(source), [])
+        if source.exhausted:
+            # Still inside a quoted field: the record continues on the next line
+            if len(pending) >= CSV_MAX_RECORD_LINES or pending_bytes > CSV_MAX_RECORD_BYTES:
+                yield start, None, f"Record spans lines {start}-{line_number} without closing its quoted field"
+                pending, pending_bytes = [], 0
+            continue
+        
+        pending, pending_bytes = [], 0
+        if not any(value.strip() for value in values):
+            continue
+        
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) > len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        
+        # Empty cells fall back to the model defaults
+        yield start, {name: value for name, value in zip(header, values) if value != ""}, None
+    
+    if pending:
+        yield start, None, "Unterminated quoted field"
+
+
+async def _ndjson_rows(lines: AsyncIterator[str]):
+    """Yield (line, row, error) from newline-delimited JSON objects."""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+class _ImportReport:
+    """Counters and per-row errors of one import."""
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+    
+    def error(self, line: int, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+        else:
+            self.errors_truncated = True
+    
+    def as_dict(self) -> dict:
+        duration = time.monotonic() - self.started
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "errorsTruncated": self.errors_truncated,
+            "durationSeconds": round(duration, 3),
+            "rowsPerSecond": round(self.received / duration, 1) if duration > 0 else None
+        }
+
+
+async def _without_duplicates(documents: list, lines: list, report: _ImportReport) -> tuple:
+    """Drop rows whose email is already stored or repeated in the batch."""
+    emails = [document["email"] for document in documents]
+    seen = {doc["email"] async for doc in leads_collection.find({"email": {"$in": emails}}, {"email": 1})}
+    
+    kept_documents, kept_lines = [], []
+    for document, line in zip(documents, lines):
+        if document["email"] in seen:
+            report.duplicates += 1
+            report.error(line, "Lead with this email already exists")
+            continue
+        seen.add(document["email"])
+        kept_documents.append(document)
+        kept_lines.append(line)
+    return kept_documents, kept_lines
+
+
+async def _insert_batch(documents: list, lines: list, report: _ImportReport, check_duplicates: bool = False):
+    """Insert one batch unordered, mapping write errors back to input lines."""
+    if check_duplicates:
+        documents, lines = await _without_duplicates(documents, lines, report)
+        if not documents:
+            return
+    
+    failed = {}
+    try:
+        await leads_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as exc:
+        failed = {error["index"]: error for error in exc.details.get("writeErrors", [])}
+    
+    for index, error in failed.items():
+        if error.get("code") == DUPLICATE_KEY_ERROR:
+            report.duplicates += 1
+            report.error(lines[index], "Lead with this email already exists")
+        else:
+            report.failed += 1
+            report.error(lines[index], error.get("errmsg", "Insert failed"))
+    
+    inserted = [document for index, document in enumerate(documents) if index not in failed]
+    report.inserted += len(inserted)
+    
+    # Update dashboard metrics rollup, then drop cached dashboards and client copies
+    await track_leads_created(inserted)
+    if inserted:
+        await invalidate_dashboards(*inserted)
+        await bump_generations("leads")
+
+
+async def import_leads(
+    chunks: AsyncIterator[bytes],
+    format: ImportFormat,
+    user_data: dict,
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> dict:
+    """Import leads from a CSV or NDJSON byte stream.
+    
+    Returns counts of received, inserted, duplicate, invalid and failed rows,
+    up to MAX_REPORTED_ERRORS per-line errors, and the throughput.
+    """
+    report = _ImportReport()
+    default_agent = await find_default_agent(user_data)
+    parse_rows = _csv_rows if format == "csv" else _ndjson_rows
+    
+    # Without the unique index duplicates would be inserted silently
+    check_duplicates = LEAD_EMAIL_INDEX not in await leads_collection.index_information()
+    if check_duplicates:
+        logger.warning(f"Unique index {LEAD_EMAIL_INDEX} on leads is missing; checking import duplicates per batch")
+    
+    documents, lines = [], []
+    async for line, row, error in parse_rows(_iter_lines(chunks)):
+        report.received += 1
+        if error is None:
+            try:
+                lead_data = LeadCreate(**{LEAD_IMPORT_KEYS.get(key, key): value for key, value in row.items()})
+            except ValidationError as exc:
+                error = _validation_message(exc)
+        if error is not None:
+            report.invalid += 1
+            report.error(line, error)
+            continue
+        
+        documents.append(build_lead_document(lead_data, user_data, default_agent))
+        lines.append(line)
+        if len(documents) >= batch_size:
+            await _insert_batch(documents, lines, report, check_duplicates)
+            documents, lines = [], []
+    
+    if documents:
+        await _insert_batch(documents, lines, report, check_duplicates)
+    
+    result = report.as_dict()
+    logger.info(
+        f"Imported {result['inserted']}/{result['received']} leads "
+        f"({result['duplicates']} duplicates, {result['invalid']} invalid) "
+        f"in {result['durationSeconds']}s"
+    )
+    return result
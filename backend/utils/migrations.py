@@ -0,0 +1,112 @@
+"""Data migrations: idempotent backfills for documents written before a schema change.
+
+`run_startup_migrations` applies them in the background at every start, so
+an upgraded deployment needs no manual step; each one only touches what is
+still missing. They can also be run through `python manage.py`.
+"""
+import logging
+
+from pymongo import UpdateOne
+
+from database.connection import leads_collection, viewings_collection, sales_collection
+from models.money import amount_to_cents
+from utils.conditional import bump_generations
+from utils.daily_metrics import ensure_daily_metrics
+from utils.search import lead_search_tokens, SEARCH_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# (collection, display field, numeric cents field)
+NUMERIC_AMOUNT_FIELDS = [
+    (sales_collection, "value", "value_cents"),
+    (viewings_collection, "price", "price_cents"),
+    (leads_collection, "budget", "budget_cents"),
+]
+
+
+async def migrate_numeric_amounts(batch_size: int = 1000) -> dict:
+    """Backfill the numeric cents fields from their display strings in batches.
+
+    Only documents missing the numeric field are touched, so the migration is
+    safe to re-run. Returns the number of updated documents per collection.
+    """
+    migrated = {}
+    
+    for collection, source, target in NUMERIC_AMOUNT_FIELDS:
+        query = {target: {"$exists": False}, source: {"$exists": True}}
+        cursor = collection.find(query, {source: 1}).batch_size(batch_size)
+        
+        operations = []
+        updated = 0
+        async for doc in cursor:
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {target: amount_to_cents(doc.get(source))}}
+            ))
+            if len(operations) >= batch_size:
+                result = await collection.bulk_write(operations, ordered=False)
+                updated += result.modified_count
+                operations = []
+        
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+        
+        migrated[collection.name] = updated
+        logger.info(f"Backfilled {target} on {updated} {collection.name} documents")
+    
+    return migrated
+
+
+async def backfill_numeric_amounts():
+    """Startup step: backfill the cents fields and invalidate clients' copies of what changed."""
+    migrated = await migrate_numeric_amounts()
+    changed = [name for name, count in migrated.items() if count]
+    if changed:
+        await bump_generations(*changed)
+
+
+async def backfill_lead_search_tokens(batch_size: int = 1000, rebuild: bool = False) -> int:
+    """Build `search_tokens` for leads that lack them (or for all leads with rebuild=True)."""
+    query = {} if rebuild else {"search_tokens": {"$exists": False}}
+    projection = {field: 1 for field in SEARCH_FIELDS}
+    cursor = leads_collection.find(query, projection).batch_size(batch_size)
+    
+    operations = []
+    updated = 0
+    async for lead in cursor:
+        operations.append(UpdateOne(
+            {"_id": lead["_id"]},
+            {"$set": {"search_tokens": lead_search_tokens(lead)}}
+        ))
+        if len(operations) >= batch_size:
+            result = await leads_collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    
+    if operations:
+        result = await leads_collection.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+    
+    logger.info(f"Built search tokens for {updated} leads")
+    return updated
+
+
+async def backfill_search_tokens():
+    """Startup step: tokenize leads written before search tokens existed so search finds them."""
+    if await backfill_lead_search_tokens():
+        await bump_generations("leads")
+
+
+async def run_startup_migrations():
+    """Backfill what existing data is missing; each step is logged and skipped on failure."""
+    steps = [
+        ("numeric amounts", backfill_numeric_amounts),
+        ("lead search tokens", backfill_search_tokens),
+        ("daily metrics rollup", ensure_daily_metrics),
+    ]
+    for name, step in steps:
+        try:
+            await step()
+        except Exception:
+            logger.exception(f"Startup migration failed: {name}")
@@ -0,0 +1,163 @@
+"""Keyset (cursor) pagination helpers for the list endpoints.
+
+A cursor is the opaque, URL-safe encoding of the sort key of the last document
+on a page. Continuing from it uses a range query on the sort index instead of
+`skip`, so deep pages cost the same as the first one.
+"""
+import asyncio
+import base64
+import math
+from datetime import datetime
+from typing import Literal, Optional
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException
+
+# How list responses report the total: skipped, exact count, or cheap estimate
+TotalMode = Literal["off", "exact", "estimated"]
+
+# Filtered "estimated" counts stop at this many matches
+TOTAL_COUNT_CAP = 10_000
+
+# Types a sort key value may have; anything else (e.g. an operator document) is rejected.
+# None stands for a missing or null sort field.
+CURSOR_VALUE_TYPES = (datetime, ObjectId, str, type(None))
+
+# Default list order: newest first, with _id as a unique tie-breaker
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+
+
+def encode_cursor(doc: dict, sort: list) -> str:
+    """Encode the sort key of a document into an opaque cursor."""
+    key = [doc.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: list) -> list:
+    """Decode a cursor back into sort key values."""
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        # Bad base64, bad JSON or bad Extended JSON values ({"$oid": "zz"}, {"$date": "x"}, ...)
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if not isinstance(key, list) or len(key) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in key):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return key
+
+
+def _after(value, direction: int) -> list:
+    """Conditions matching the values of one sort field strictly after `value`.
+
+    Missing and null values sort before all others, so they follow every value
+    in descending order and precede every value in ascending order.
+    """
+    if value is None:
+        return [] if direction < 0 else [{"$ne": None}]
+    if direction < 0:
+        return [{"$lt": value}, None]
+    return [{"$gt": value}]
+
+
+def keyset_filter(cursor: str, sort: list) -> dict:
+    """Build the query matching documents strictly after the cursor in sort order."""
+    key = decode_cursor(cursor, sort)
+    
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        tied = {prev_field: key[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        for condition in _after(key[i], direction):
+            clauses.append({**tied, field: condition})
+    
+    return {"$or": clauses}
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    sort: list,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    projection: Optional[dict] = None
+) -> tuple:
+    """Fetch one page of documents and the cursor of the following page.
+
+    With a cursor the page continues after it (keyset mode); otherwise `skip`
+    is applied (page mode). The next cursor is None on the last page.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor, sort)]}
+        skip = 0
+    
+    # Fetch one extra document to know whether another page exists
+    docs = await collection.find(query, projection).sort(sort).skip(skip).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    
+    return docs, next_cursor
+
+
+async def count_total(collection, query: dict, mode: str) -> tuple:
+    """Count the documents matching a list query.
+
+    Returns (total, is_estimate). "estimated" uses the collection metadata
+    count for unfiltered queries and stops counting at TOTAL_COUNT_CAP for
+    filtered ones.
+    """
+    if mode == "off":
+        return None, False
+    
+    if mode == "estimated":
+        if not query:
+            return await collection.estimated_document_count(), True
+        total = await collection.count_documents(query, limit=TOTAL_COUNT_CAP)
+        return total, total >= TOTAL_COUNT_CAP
+    
+    return await collection.count_documents(query), False
+
+
+async def paginate(
+    collection,
+    query: dict,
+    sort: list,
+    page: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    include_total: Optional[str] = None,
+    projection: Optional[dict] = None
+) -> tuple:
+    """Fetch a page and its pagination metadata, running the count concurrently.
+
+    The total defaults to an exact count in page mode and is skipped in keyset
+    mode. Returns (documents, metadata) where metadata holds limit, nextCursor
+    and, as applicable, page, total, pages and totalEstimated.
+    """
+    mode = include_total or ("off" if cursor else "exact")
+    
+    (docs, next_cursor), (total, is_estimate) = await asyncio.gather(
+        fetch_page(
+            collection, query, sort, limit,
+            cursor=cursor, skip=(page - 1) * limit, projection=projection
+        ),
+        count_total(collection, query, mode)
+    )
+    
+    metadata = {"limit": limit, "nextCursor": next_cursor}
+    if not cursor:
+        metadata["page"] = page
+    if total is not None:
+        metadata["total"] = total
+        if not cursor:
+            metadata["pages"] = math.ceil(total / limit)
+        if is_estimate:
+            metadata["totalEstimated"] = True
+    
+    return docs, metadata
@@ -0,0 +1,42 @@
+"""Response views for the list endpoints, backed by MongoDB projections.
+
+`view=summary` returns the columns each resource's table shows, `fields=`
+returns an explicit comma-separated set, and `view=full` (the default) the
+whole document. Sort keys are always included so keyset cursors still work.
+"""
+import re
+from typing import Literal, Optional
+
+from fastapi import HTTPException
+
+ViewMode = Literal["summary", "full"]
+
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def list_projection(
+    view: Optional[str],
+    fields: Optional[str],
+    summary_fields: tuple,
+    sort: list,
+    internal_fields: tuple = ()
+) -> Optional[dict]:
+    """Build the projection for a list request.
+
+    Returns None for the full document, or an inclusion projection.
+    Internal fields are never included and are excluded from full documents.
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        invalid = [name for name in names if not _FIELD_RE.match(name)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid)}")
+    elif view == "summary":
+        names = list(summary_fields)
+    else:
+        return {field: 0 for field in internal_fields} or None
+    
+    projection = {name: 1 for name in names if name not in internal_fields}
+    for field, _ in sort:
+        projection[field] = 1
+    return projection
@@ -0,0 +1,42 @@
+"""Query builders for filters shared by routes and background jobs."""
+from typing import Optional
+
+from bson import ObjectId
+
+from models.money import amount_to_cents
+from utils.search import lead_search_query
+
+
+def leads_query(
+    search: Optional[str],
+    status: Optional[str],
+    min_budget: Optional[float],
+    max_budget: Optional[float],
+    user_data: dict
+) -> dict:
+    """Lead filters with role scoping, shared by the list and export routes and email campaigns."""
+    
+    # Build query
+    query = {}
+    
+    # Add search filter
+    if search:
+        query.update(lead_search_query(search))
+    
+    # Add status filter
+    if status:
+        query["status"] = status
+    
+    # Add budget range filter (on the numeric budget in cents)
+    if min_budget is not None or max_budget is not None:
+        query["budget_cents"] = {}
+        if min_budget is not None:
+            query["budget_cents"]["$gte"] = amount_to_cents(min_budget)
+        if max_budget is not None:
+            query["budget_cents"]["$lte"] = amount_to_cents(max_budget)
+    
+    # Role-based access: agents can only see their own leads
+    if user_data.get("role") == "agent":
+        query["assigned_agent_id"] = ObjectId(user_data.get("user_id"))
+    
+    return query
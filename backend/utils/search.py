@@ -0,0 +1,76 @@
+"""Prefix-token search index for leads.
+
+Each lead stores a `search_tokens` array holding every prefix of its
+normalised name words, email address parts and phone digit groups. The array
+has a multikey index, so a search is an indexed equality match per term
+instead of an unanchored case-insensitive `$regex` scan.
+"""
+import re
+
+# Fields whose changes require the tokens to be rebuilt
+SEARCH_FIELDS = ("name", "email", "phone")
+
+# Longer prefixes are not indexed; longer search terms are truncated to match
+MAX_PREFIX_LENGTH = 24
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _prefixes(token: str) -> set:
+    """All prefixes of a token, up to MAX_PREFIX_LENGTH characters."""
+    return {token[:i] for i in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1)}
+
+
+def _name_tokens(name: str) -> set:
+    return set(_WORD_RE.findall(name.lower()))
+
+
+def _email_tokens(email: str) -> set:
+    email = email.lower()
+    local_part = email.split("@", 1)[0]
+    return {email, local_part} | set(_WORD_RE.findall(email))
+
+
+def _phone_tokens(phone: str) -> set:
+    groups = _DIGITS_RE.findall(phone)
+    return set(groups) | {"".join(groups)} if groups else set()
+
+
+def lead_search_tokens(lead: dict) -> list:
+    """Build the `search_tokens` array for a lead document."""
+    tokens = set()
+    tokens |= _name_tokens(lead.get("name") or "")
+    tokens |= _email_tokens(lead.get("email") or "")
+    tokens |= _phone_tokens(lead.get("phone") or "")
+    
+    prefixes = set()
+    for token in tokens:
+        prefixes |= _prefixes(token)
+    return sorted(prefixes)
+
+
+def _search_terms(search: str) -> list:
+    """Normalise a search string into index terms."""
+    terms = []
+    for word in search.lower().split():
+        # Phone numbers are indexed by digits only
+        if not re.search(r"[a-z@]", word):
+            digits = "".join(_DIGITS_RE.findall(word))
+            if digits:
+                terms.append(digits)
+                continue
+        # Email addresses are indexed whole; other words by their alphanumeric parts
+        if "@" in word:
+            terms.append(word)
+        else:
+            terms.extend(_WORD_RE.findall(word))
+    return [term[:MAX_PREFIX_LENGTH] for term in terms]
+
+
+def lead_search_query(search: str) -> dict:
+    """Build the query matching leads where every search term prefixes an indexed token."""
+    terms = _search_terms(search)
+    if not terms:
+        return {}
+    return {"search_tokens": {"$all": terms}}
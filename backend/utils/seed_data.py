@@ -1,6 +1,9 @@
+import asyncio
 from datetime import datetime, timedelta
 from bson import ObjectId
-from auth.jwt_handler import hash_password
+from auth.jwt_handler import hash_password_async
+from utils.daily_metrics import rebuild_daily_metrics
+from utils.migrations import migrate_numeric_amounts, backfill_lead_search_tokens
 from database.connection import (
     users_collection, 
     leads_collection, 
@@ -23,13 +26,16 @@ async def seed_database():
     
     print("Seeding database with initial data...")
     
+    # Hash the demo passwords on the password executor, off the event loop
+    password_hashes = await asyncio.gather(*(hash_password_async("password123") for _ in range(3)))
+    
     # Create users
     users_data = [
         {
             "_id": ObjectId("65a1b2c3d4e5f6789abcdef0"),
             "name": "Sarah Johnson",
             "email": "sarah.johnson@richmansdream.com",
-            "password": hash_password("password123"),
+            "password": password_hashes[0],
             "role": "admin",
             "avatar": "https://images.unsplash.com/photo-1494790108755-2616b9997701?w=100&h=100&fit=crop&crop=face",
             "created_at": datetime.utcnow(),
@@ -39,7 +45,7 @@ async def seed_database():
             "_id": ObjectId("65a1b2c3d4e5f6789abcdef1"),
             "name": "Michael Chen",
             "email": "michael.chen@richmansdream.com",
-            "password": hash_password("password123"),
+            "password": password_hashes[1],
             "role": "agent",
             "avatar": "https://images.unsplash.com/photo-1472099645785-5658abf4ff4e?w=100&h=100&fit=crop&crop=face",
             "created_at": datetime.utcnow(),
@@ -49,7 +55,7 @@ async def seed_database():
             "_id": ObjectId("65a1b2c3d4e5f6789abcdef2"),
             "name": "Lisa Park",
             "email": "lisa.park@richmansdream.com",
-            "password": hash_password("password123"),
+            "password": password_hashes[2],
             "role": "agent",
             "avatar": "https://images.unsplash.com/photo-1438761681033-6461ffad8d80?w=100&h=100&fit=crop&crop=face",
             "created_at": datetime.utcnow(),
@@ -342,6 +348,11 @@ Rich Man Dream Real Estate""",
     
     await emails_collection.insert_many(emails_data)
     
+    # Derive numeric amounts, search tokens and the dashboard rollup for the seeded data
+    await migrate_numeric_amounts()
+    await backfill_lead_search_tokens()
+    await rebuild_daily_metrics()
+    
     print("Database seeded successfully!")
     print("Demo login credentials:")
     print("- Email: sarah.johnson@richmansdream.com")
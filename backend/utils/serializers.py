@@ -0,0 +1,65 @@
+"""Shared BSON-to-JSON serialization for API responses.
+
+Documents are prepared in a single pass (`_id` renamed to `id`, internal
+fields dropped) and rendered straight to bytes by `CRMJSONResponse`, which
+encodes ObjectId and datetime values itself. Routes return the response
+object directly, so FastAPI does not walk the payload again with
+`jsonable_encoder`. orjson is used when installed.
+"""
+from datetime import date, datetime
+import json
+
+from bson import Decimal128, ObjectId
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _encode_bson(value):
+    """Encode the BSON types that JSON encoders do not know."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def render_json(content) -> bytes:
+    """Render content containing BSON values to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_encode_bson)
+    return json.dumps(content, default=_encode_bson, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class CRMJSONResponse(JSONResponse):
+    """JSON response that renders MongoDB documents without a jsonable_encoder pass."""
+
+    def render(self, content) -> bytes:
+        return render_json(content)
+
+
+async def validation_error_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+    """FastAPI's 422 body, rendered so a rejected value such as Infinity cannot turn it into a 500."""
+    return CRMJSONResponse(status_code=422, content={"detail": jsonable_encoder(exc.errors())})
+
+
+def serialize_document(doc: dict, exclude: tuple = ()) -> dict:
+    """Prepare a MongoDB document for a response: `_id` becomes `id`, excluded fields are dropped."""
+    output = {"id": doc["_id"]} if "_id" in doc else {}
+    for key, value in doc.items():
+        if key != "_id" and key not in exclude:
+            output[key] = value
+    return output
+
+
+def serialize_documents(docs: list, exclude: tuple = ()) -> list:
+    """Prepare a list of MongoDB documents for a response."""
+    return [serialize_document(doc, exclude) for doc in docs]
@@ -0,0 +1,124 @@
+"""Compiled email template rendering.
+
+A template's subject and content are parsed once into segments (literal text
+and variable names) and cached per (template id, updated_at), so rendering an
+email is a single join over precomputed values instead of one `str.replace`
+pass per variable. New templates may only use the variables the renderer
+supplies (`unknown_placeholders`); in older stored templates any other
+placeholder is left as written.
+"""
+import re
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+
+PLACEHOLDER_RE = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+# Variables the renderer supplies
+TEMPLATE_VARIABLES = (
+    "lead_name",
+    "lead_email",
+    "lead_phone",
+    "lead_budget",
+    "property_type",
+    "agent_name",
+    "agent_email",
+    "company_name",
+    "date",
+    "time"
+)
+
+COMPILED_TEMPLATE_CACHE_SIZE = 256
+
+
+def template_placeholders(text: str) -> set:
+    """Names of the {placeholders} used in a template string."""
+    return set(PLACEHOLDER_RE.findall(text or ""))
+
+
+def unknown_placeholders(*texts: str) -> list:
+    """Sorted placeholders used in these template strings that the renderer cannot fill."""
+    used = set().union(*(template_placeholders(text) for text in texts))
+    return sorted(used - set(TEMPLATE_VARIABLES))
+
+
+def compile_text(text: str) -> tuple:
+    """Parse a template string into alternating (literal, variable) segments.
+    
+    The result is a tuple of strings where odd positions are variable names.
+    Placeholders the renderer does not supply stay part of the literal text.
+    """
+    segments = []
+    literal = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(text or ""):
+        literal.append(text[position:match.start()])
+        if match.group(1) in TEMPLATE_VARIABLES:
+            segments.append("".join(literal))
+            segments.append(match.group(1))
+            literal = []
+        else:
+            literal.append(match.group(0))
+        position = match.end()
+    literal.append((text or "")[position:])
+    segments.append("".join(literal))
+    return tuple(segments)
+
+
+def render_segments(segments: tuple, values: dict) -> str:
+    """Render compiled segments with precomputed values."""
+    parts = list(segments)
+    for index in range(1, len(parts), 2):
+        parts[index] = values[parts[index]]
+    return "".join(parts)
+
+
+def template_values(lead: dict, user_data: dict, now: Optional[datetime] = None) -> dict:
+    """Values of every supported variable for one lead, as strings."""
+    now = now or datetime.now()
+    return {
+        "lead_name": str(lead.get("name", "")),
+        "lead_email": str(lead.get("email", "")),
+        "lead_phone": str(lead.get("phone", "")),
+        "lead_budget": str(lead.get("budget", "")),
+        "property_type": str(lead.get("property_type", "")),
+        "agent_name": str(user_data.get("name", "")),
+        "agent_email": str(user_data.get("email", "")),
+        "company_name": "Rich Man Dream",
+        "date": now.strftime("%B %d, %Y"),
+        "time": now.strftime("%I:%M %p")
+    }
+
+
+class CompiledTemplate:
+    """Subject and content of one template, parsed once."""
+    
+    def __init__(self, subject: str, content: str):
+        self.subject = compile_text(subject)
+        self.content = compile_text(content)
+    
+    def render(self, values: dict) -> tuple:
+        """Render (subject, content) with values from `template_values`."""
+        return render_segments(self.subject, values), render_segments(self.content, values)
+
+
+_compiled_templates: "OrderedDict[tuple, CompiledTemplate]" = OrderedDict()
+_compiled_templates_lock = Lock()
+
+
+def compiled_template(template: dict) -> CompiledTemplate:
+    """The compiled form of a template document, cached per (_id, updated_at)."""
+    key = (template.get("_id"), template.get("updated_at"))
+    with _compiled_templates_lock:
+        compiled = _compiled_templates.get(key)
+        if compiled is not None:
+            _compiled_templates.move_to_end(key)
+            return compiled
+    
+    compiled = CompiledTemplate(template.get("subject", ""), template.get("content", ""))
+    with _compiled_templates_lock:
+        _compiled_templates[key] = compiled
+        while len(_compiled_templates) > COMPILED_TEMPLATE_CACHE_SIZE:
+            _compiled_templates.popitem(last=False)
+    return compiled
@@ -0,0 +1,92 @@
+"""Per-lead activity timeline merged from the activity collections.
+
+Calls, emails, viewings, sales and sale stage changes all carry `lead_id` and
+`created_at` and are indexed on (lead_id, created_at, _id). A page is built by
+reading at most `limit + 1` documents from each source in index order, all
+concurrently, and k-way merging them newest first. Paging is keyset-based on
+(created_at, _id), so a page costs the same whatever the history length.
+"""
+import asyncio
+import heapq
+from datetime import datetime
+from itertools import islice
+from typing import Optional
+
+from database.connection import (
+    calls_collection,
+    emails_collection,
+    viewings_collection,
+    sales_collection,
+    sale_events_collection
+)
+from utils.pagination import NEWEST_FIRST, encode_cursor, keyset_filter
+from utils.serializers import serialize_document
+
+# Event type -> (collection, projection)
+TIMELINE_SOURCES = {
+    "call": (calls_collection, {
+        "type": 1, "duration": 1, "status": 1, "notes": 1, "agent": 1, "date": 1, "time": 1, "created_at": 1
+    }),
+    "email": (emails_collection, {
+        "subject": 1, "status": 1, "direction": 1, "email_type": 1, "agent_name": 1, "created_at": 1
+    }),
+    "viewing": (viewings_collection, {
+        "property": 1, "date": 1, "time": 1, "status": 1, "agent": 1, "created_at": 1
+    }),
+    "sale": (sales_collection, {
+        "property": 1, "stage": 1, "value": 1, "value_cents": 1, "probability": 1, "agent": 1, "created_at": 1
+    }),
+    "sale_stage": (sale_events_collection, {
+        "sale_id": 1, "stage": 1, "previous_stage": 1, "agent_id": 1, "created_at": 1
+    })
+}
+
+
+def _sort_key(item: tuple) -> tuple:
+    _, doc = item
+    return doc["created_at"], doc["_id"]
+
+
+async def lead_timeline(lead_id, limit: int, cursor: Optional[str] = None) -> tuple:
+    """One page of a lead's activity, newest first. Returns (items, next_cursor)."""
+    query = {"lead_id": lead_id, "created_at": {"$type": "date"}}
+    if cursor:
+        query = {"$and": [query, keyset_filter(cursor, NEWEST_FIRST)]}
+    
+    types = list(TIMELINE_SOURCES)
+    results = await asyncio.gather(*(
+        collection.find(query, projection).sort(NEWEST_FIRST).limit(limit + 1).to_list(length=limit + 1)
+        for collection, projection in TIMELINE_SOURCES.values()
+    ))
+    
+    merged = heapq.merge(
+        *([(event_type, doc) for doc in docs] for event_type, docs in zip(types, results)),
+        key=_sort_key,
+        reverse=True
+    )
+    page = list(islice(merged, limit + 1))
+    
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][1], NEWEST_FIRST)
+    
+    items = [
+        {"type": event_type, "at": doc["created_at"], "data": serialize_document(doc)}
+        for event_type, doc in page
+    ]
+    return items, next_cursor
+
+
+async def record_sale_stage_change(before: dict, after: dict):
+    """Record a sale's stage change as a timeline event for its lead."""
+    if not before or not after or before.get("stage") == after.get("stage"):
+        return
+    await sale_events_collection.insert_one({
+        "sale_id": after["_id"],
+        "lead_id": after.get("lead_id"),
+        "agent_id": after.get("agent_id"),
+        "stage": after.get("stage"),
+        "previous_stage": before.get("stage"),
+        "created_at": datetime.utcnow()
+    })
@@ -0,0 +1,45 @@
+"""Single-round-trip write helpers shared by the CRUD routes."""
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+
+async def raise_not_found_or_forbidden(collection, doc_id: ObjectId, not_found_detail: str):
+    """Explain why a scoped write matched nothing: 404 if the document is missing, else 403."""
+    if await collection.find_one({"_id": doc_id}, {"_id": 1}):
+        raise HTTPException(status_code=403, detail="Access denied")
+    raise HTTPException(status_code=404, detail=not_found_detail)
+
+
+async def update_scoped(
+    collection,
+    doc_id: ObjectId,
+    scope: dict,
+    update: dict,
+    not_found_detail: str,
+    projection: Optional[dict] = None
+) -> tuple:
+    """`$set` fields on a document the caller may access, in one round trip.
+
+    The access check is part of the filter. The stored document is returned
+    as it was before the update, and the updated version is derived from it,
+    so callers get both (before, after) without re-reading.
+    """
+    query = {"_id": doc_id, **scope}
+    
+    if update:
+        before = await collection.find_one_and_update(
+            query,
+            {"$set": update},
+            projection=projection,
+            return_document=ReturnDocument.BEFORE
+        )
+    else:
+        before = await collection.find_one(query, projection)
+    
+    if before is None:
+        await raise_not_found_or_forbidden(collection, doc_id, not_found_detail)
+    
+    return before, {**before, **update}
@@ -39,7 +39,7 @@ const Dashboard = () => {
       const [statsRes, chartsRes, leadsRes] = await Promise.all([
         axios.get('/dashboard/stats'),
         axios.get('/dashboard/charts'),
-        axios.get('/leads?limit=3')
+        axios.get('/leads?limit=3&view=summary')
       ]);
 
       setDashboardStats(statsRes.data);
@@ -38,7 +38,8 @@ const Emails = () => {
         limit: pagination.limit,
         ...(searchTerm && { search: searchTerm }),
         ...(statusFilter !== 'all' && { status: statusFilter }),
-        direction: activeTab === 'sent' ? 'outbound' : activeTab === 'inbox' ? 'inbound' : undefined
+        direction: activeTab === 'sent' ? 'outbound' : activeTab === 'inbox' ? 'inbound' : undefined,
+        view: 'summary'
       };
 
       const response = await axios.get('/emails', { params });
@@ -34,7 +34,8 @@ const Leads = () => {
         page: pagination.page,
         limit: pagination.limit,
         ...(searchTerm && { search: searchTerm }),
-        ...(statusFilter !== 'all' && { status: statusFilter })
+        ...(statusFilter !== 'all' && { status: statusFilter }),
+        view: 'summary'
       };
 
       const response = await axios.get('/leads', { params });